@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import Response
 from typing import Dict, Any, Literal
 from app.services.task_service import task_service
+from app.services.inference_service import inference_service
+from app.services.admission import AdmissionRejected
+from app.core.config import settings
 from app.services.matting_service import MattingService
 
 router = APIRouter(prefix="/matting", tags=["matting"])
@@ -33,26 +37,59 @@ async def create_matting_task(
         # 创建任务
         task = await matting_service.create_matting_task(file_url, model_type)
 
-        # 在后台处理任务
-        background_tasks.add_task(task_service.process_task, task["task_id"])
+        # 按分派模式交给worker或在后台处理
+        task_service.dispatch(background_tasks, [task["task_id"]])
 
         return task
+    except AdmissionRejected as e:
+        raise e.to_http_exception()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/infer")
+async def infer_matting(
+    request: Request,
+    model_type: Literal["default", "hr", "portrait"] = "default",
+) -> Response:
+    """
+    同步抠图：请求体为图片，直接返回PNG格式的mask
+
+    不创建任务、不经过MinIO；超过 INFER_MAX_BYTES 或 INFER_MAX_PIXELS 的图片返回413，
+    应改用 /process 创建异步任务
+
+    Args:
+        request: 请求，body为图片的原始字节，Content-Type 为 image/*
+        model_type: 模型类型，同 /process
+    """
+    data = await inference_service.read_image(request, settings.INFER_MAX_PIXELS)
+    try:
+        result = await inference_service.infer(
+            matting_service.MODEL_MAPPING[model_type], model_type, data
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return Response(content=result["result_image"], media_type="image/png")
+
+
 @router.get("/tasks/{task_id}")
-async def get_task_status(task_id: str) -> Dict[str, Any]:
+async def get_task_status(
+    task_id: str, wait: int = Query(0, ge=0, le=settings.TASK_MAX_WAIT)
+) -> Dict[str, Any]:
     """
     获取任务状态
 
     Args:
         task_id: 任务ID
+        wait: 长轮询等待时间（秒），大于0时在任务结束或超时后才返回
 
     Returns:
         任务状态信息
     """
-    task = await matting_service.get_task_status(task_id)
+    task = await matting_service.get_task_status(task_id, wait)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
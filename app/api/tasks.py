@@ -1,9 +1,17 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Optional
+from datetime import datetime
+import json
 import uuid
 from app.services.task_service import task_service
+from app.services.result_cache import result_cache
+from app.services.admission import AdmissionRejected
 from app.core.model_registry import model_registry
-from app.utils.minio_client import minio_client
+from app.utils.minio_client import async_minio_client
+from app.utils.redis_client import async_redis_client, TASK_STATUSES
+from app.core.config import settings
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
@@ -34,11 +42,21 @@ async def upload_file(file: UploadFile = File(...)) -> Dict[str, Any]:
         file_content = await file.read()
 
         # 上传到MinIO
-        file_url = minio_client.upload_file(
+        file_url, (width, height) = await async_minio_client.upload_file(
             file_content, file.filename, file.content_type
         )
 
-        return {"message": "文件上传成功", "file_url": file_url}
+        # 记录图片尺寸，创建任务时据此估算推理耗时
+        await async_redis_client.set_file_meta(
+            async_minio_client.client.object_name(file_url), width, height
+        )
+
+        return {
+            "message": "文件上传成功",
+            "file_url": file_url,
+            "width": width,
+            "height": height,
+        }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -57,25 +75,168 @@ async def create_task(
 
         # 创建任务
         task_id = str(uuid.uuid4())
-        task = task_service.create_task(task_id, file_url, model_id)
+        task = await task_service.create_task(task_id, file_url, model_id)
 
-        # 在后台处理任务
-        background_tasks.add_task(task_service.process_task, task_id)
+        # 按分派模式交给worker或在后台处理
+        task_service.dispatch(background_tasks, [task_id])
 
         return task
+    except AdmissionRejected as e:
+        raise e.to_http_exception()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BatchTaskRequest(BaseModel):
+    """批量创建任务请求"""
+
+    file_urls: List[str] = Field(..., min_length=1, max_length=settings.TASK_BATCH_MAX_SIZE)
+    model_id: str
+    variant: str = ""
+
+
+@router.post("/batch")
+async def create_tasks(
+    request: BatchTaskRequest, background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    """
+    批量创建同一模型的AI处理任务
+
+    所有任务在一个Redis pipeline中写入，按分派模式由worker或API后台任务处理
+
+    Args:
+        request: 文件URL列表、模型ID及模型变体
+        background_tasks: 后台任务处理器
+
+    Returns:
+        创建的任务列表
+    """
+    if not model_registry.has_model(request.model_id):
+        raise HTTPException(status_code=400, detail=f"Model {request.model_id} not found")
+
+    try:
+        tasks = await task_service.create_tasks(
+            request.file_urls, request.model_id, request.variant
+        )
+        task_service.dispatch(background_tasks, [task["task_id"] for task in tasks])
+        return {"count": len(tasks), "tasks": tasks}
+    except AdmissionRejected as e:
+        raise e.to_http_exception()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/")
+async def get_tasks_status(
+    ids: Optional[str] = Query(None, description="逗号分隔的任务ID列表"),
+    status: Optional[str] = Query(None, description="任务状态"),
+    model_id: Optional[str] = Query(None, description="模型ID"),
+    since: Optional[datetime] = Query(None, description="只返回该时间之后创建的任务"),
+    limit: int = Query(100, ge=1, le=settings.TASK_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，从该位置继续列出"),
+) -> Dict[str, Any]:
+    """
+    批量获取任务状态，或按状态/模型列出任务
+
+    指定ids时所有任务在一次pipeline往返中读取；
+    否则从状态/模型索引中按创建时间升序列出任务，不扫描整个keyspace。
+    同时指定状态和模型时单次扫描的索引条目有上限，返回的任务可能少于 limit，
+    next_cursor 不为空时以其作为 cursor 继续列出
+
+    Args:
+        ids: 逗号分隔的任务ID列表
+        status: 任务状态
+        model_id: 模型ID
+        since: 只返回该时间之后创建的任务
+        limit: 列表模式下的最大返回数量
+        cursor: 上一页返回的 next_cursor
+
+    Returns:
+        指定ids时返回已找到的任务列表及不存在的任务ID，否则返回任务列表及下一页游标
+    """
+    if ids is None:
+        if not status and not model_id:
+            raise HTTPException(
+                status_code=400, detail="需要指定 ids、status 或 model_id"
+            )
+        if status and status not in TASK_STATUSES:
+            raise HTTPException(status_code=400, detail=f"未知的任务状态: {status}")
+
+        try:
+            tasks, next_cursor = await task_service.list_tasks(
+                status=status,
+                model_id=model_id,
+                since=since.timestamp() if since else None,
+                limit=limit,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"count": len(tasks), "tasks": tasks, "next_cursor": next_cursor}
+
+    task_ids = [task_id for task_id in ids.split(",") if task_id]
+    if len(task_ids) > settings.TASK_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"最多支持同时查询{settings.TASK_BATCH_MAX_SIZE}个任务",
+        )
+
+    tasks = await task_service.get_tasks_status(task_ids)
+    return {
+        "tasks": [task for task in tasks if task],
+        "not_found": [
+            task_id for task_id, task in zip(task_ids, tasks) if task is None
+        ],
+    }
+
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> Dict[str, Any]:
+    """获取结果缓存的命中、未命中、合并与淘汰统计"""
+    return await result_cache.get_stats()
+
+
 @router.get("/{task_id}")
-async def get_task_status(task_id: str) -> Dict[str, Any]:
-    """获取任务状态"""
-    task = task_service.get_task(task_id)
+async def get_task_status(
+    task_id: str, wait: int = Query(0, ge=0, le=settings.TASK_MAX_WAIT)
+) -> Dict[str, Any]:
+    """
+    获取任务状态
+
+    Args:
+        task_id: 任务ID
+        wait: 长轮询等待时间（秒），大于0时在任务结束或超时后才返回
+    """
+    if wait > 0:
+        task = await task_service.wait_for_task(task_id, wait)
+    else:
+        task = await task_service.get_task_status(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
 
+@router.get("/{task_id}/events")
+async def stream_task_events(task_id: str) -> StreamingResponse:
+    """
+    以Server-Sent Events推送任务状态，任务结束或超时后关闭连接
+
+    每次状态变更推送一条 `status` 事件，数据为完整的任务信息
+    """
+    if not await task_service.get_task_status(task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_stream():
+        async for task in task_service.watch_task(task_id, settings.TASK_TIMEOUT):
+            yield f"event: status\ndata: {json.dumps(task)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.delete("/{task_id}")
 async def delete_task(task_id: str) -> Dict[str, Any]:
     """
@@ -0,0 +1,141 @@
+import argparse
+import gzip
+import json
+import time
+import uuid
+import logging
+from datetime import datetime, UTC
+from typing import Dict, List
+from app.utils.redis_client import (
+    redis_client,
+    status_index,
+    model_index,
+    task_ttl,
+    TERMINAL_STATUSES,
+)
+from app.utils.minio_client import minio_client
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def archive_status(status: str, before: float) -> int:
+    """
+    将指定状态下结束时间早于 before 的任务压缩归档到MinIO，并从Redis中删除
+
+    状态索引按创建时间排序，先取出创建时间早于 before 的任务，再按结束时间筛选，
+    尚未到期的任务留在索引中等待之后的运行。
+    每批任务写成一个 gzip 压缩的 JSON Lines 文件，上传成功后才删除任务；
+    任务hash已过期的索引条目直接移除
+    """
+    index = status_index(status)
+    batch_size = settings.TASK_ARCHIVE_BATCH_SIZE
+    archived = 0
+    offset = 0
+
+    while True:
+        task_ids = redis_client.find_task_ids(index, before, batch_size, offset)
+        if not task_ids:
+            break
+
+        tasks = redis_client.get_tasks(task_ids)
+        expired = [
+            task_id for task_id, task in zip(task_ids, tasks) if task is None
+        ]
+        if expired:
+            redis_client.client.zrem(index, *expired)
+
+        records = [task for task in tasks if task and finished_before(task, before)]
+        # 未到期的任务保留在索引中，下一批从其后开始
+        offset += len(task_ids) - len(expired) - len(records)
+        if records:
+            now = datetime.now(UTC)
+            data = gzip.compress(
+                "\n".join(json.dumps(task) for task in records).encode("utf-8")
+            )
+            object_name = minio_client.save_archive(
+                data,
+                f"tasks/{status}/{now:%Y%m%d}/{now:%H%M%S}-{uuid.uuid4().hex}.jsonl.gz",
+            )
+            redis_client.delete_tasks(
+                [(task["task_id"], task.get("model_id", "")) for task in records]
+            )
+            archived += len(records)
+            logger.info(f"Archived {len(records)} {status} tasks to {object_name}")
+
+        if len(task_ids) < batch_size:
+            break
+
+    return archived
+
+
+def finished_before(task: Dict, before: float) -> bool:
+    """任务的结束时间是否早于 before，缺少结束时间时按创建时间判断"""
+    completed_at = task.get("completed_at")
+    if not completed_at:
+        return float(task.get("created_ts", 0)) < before
+    return datetime.fromisoformat(completed_at).timestamp() < before
+
+
+def prune_expired(before: float) -> Dict[str, int]:
+    """从状态索引和模型索引中移除任务hash已过期的条目"""
+    batch_size = settings.TASK_ARCHIVE_BATCH_SIZE
+    indexes: List[str] = [status_index(status) for status in TERMINAL_STATUSES]
+    indexes += [model_index(model_id) for model_id in redis_client.get_model_ids()]
+
+    pruned = {}
+    for index in indexes:
+        offset = 0
+        removed = 0
+        while True:
+            task_ids = redis_client.find_task_ids(index, before, batch_size, offset)
+            if not task_ids:
+                break
+            missing = redis_client.prune_index(index, task_ids)
+            removed += len(missing)
+            # 仍然存在的任务保留在索引中，下一批从其后开始
+            offset += len(task_ids) - len(missing)
+        if removed:
+            pruned[index] = removed
+
+    return pruned
+
+
+def run_once() -> Dict[str, int]:
+    """执行一次归档与索引清理"""
+    now = time.time()
+    stats = {}
+
+    if settings.TASK_ARCHIVE_ENABLED:
+        for status in TERMINAL_STATUSES:
+            stats[status] = archive_status(status, now - settings.TASK_ARCHIVE_AFTER)
+
+    # 创建时间晚于最短保留时间的任务不可能已过期，无需检查
+    ttls = [task_ttl(status) for status in TERMINAL_STATUSES if task_ttl(status) > 0]
+    if ttls:
+        pruned = prune_expired(now - min(ttls))
+        stats["pruned"] = sum(pruned.values())
+
+    logger.info(f"Task retention run finished: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档已结束的任务并清理任务索引")
+    parser.add_argument("--once", action="store_true", help="只执行一次")
+    args = parser.parse_args()
+
+    if args.once:
+        run_once()
+        return
+
+    while True:
+        try:
+            run_once()
+        except Exception as e:
+            logger.error(f"Error archiving tasks: {str(e)}")
+        time.sleep(settings.TASK_ARCHIVE_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -7,6 +7,7 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 100  # API异步连接池上限
 
     # MinIO配置
     MINIO_ENDPOINT: str = "localhost:9000"
@@ -14,6 +15,8 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET: str = "ai-segmentation"
     MINIO_SECURE: bool = False
+    MINIO_MAX_WORKERS: int = 16  # API中执行MinIO调用的线程数
+    MINIO_PART_SIZE_MB: int = 16  # 流式上传的分片大小（MB），最小5MB
 
     # 模型配置
     MODEL_PATH: str = "models/segmentation.onnx"
@@ -23,6 +26,78 @@ class Settings(BaseSettings):
     TASK_TIMEOUT: int = 300  # 秒
     TASK_POLL_INTERVAL: int = 2  # 秒
     TASK_MAX_POLLS: int = 150  # 最大轮询次数
+    TASK_MAX_WAIT: int = 60  # 长轮询最长等待时间（秒）
+    TASK_EVENTS_CHANNEL_PREFIX: str = "task_events:"  # 任务状态变更发布频道前缀
+    TASK_BATCH_MAX_SIZE: int = 5000  # 批量提交/查询的最大任务数
+
+    # 准入控制配置
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_DRAIN_SECONDS: float = 300.0  # 模型清空队列的预估时间上限（秒），超出时返回429
+    ADMISSION_WORKER_SLOTS: int = 1  # 集群中同一模型可并行推理的总数（worker数 x 每个worker的并发数）
+    ADMISSION_COST_FACTOR: float = 1.0  # 模型预估耗时的整体系数，按实际硬件调整
+    ADMISSION_DEFAULT_PIXELS: int = 4194304  # 未记录尺寸的文件按该像素数估算
+    FILE_META_TTL: int = 604800  # 上传文件尺寸信息的保留时间（秒）
+
+    # 同步推理配置（/infer 接口）
+    INFER_MAX_CONCURRENCY: int = 4  # API进程中同时进行的同步推理数
+    INFER_QUEUE_TIMEOUT: float = 10.0  # 等待推理名额的最长时间（秒），超时返回503
+    INFER_MAX_BYTES: int = 8 * 1024 * 1024  # 请求体最大字节数，超出返回413
+    INFER_MAX_PIXELS: int = 4194304  # 抠图输入的最大像素数
+    INFER_UPSCALE_MAX_PIXELS: int = 1048576  # 超分输入的最大像素数，输出像素数为其倍率平方倍
+
+    # 任务分派方式：queue 写入任务队列由worker执行；inline 在API进程后台执行，不写入队列（仅用于开发）
+    TASK_DISPATCH_MODE: Literal["queue", "inline"] = "queue"
+
+    # 任务队列配置（Redis Streams 消费组）
+    TASK_STREAM: str = "task_stream"
+    TASK_CONSUMER_GROUP: str = "task_workers"
+    TASK_STREAM_MAXLEN: int = 100000  # 队列近似最大长度
+    TASK_BLOCK_TIMEOUT_MS: int = 5000  # 阻塞读取超时（毫秒）
+    TASK_CLAIM_IDLE_MS: int = 300000  # 超过该空闲时间的未确认任务会被其他消费者接管（毫秒）
+    TASK_CLAIM_INTERVAL: int = 30  # 检查未确认任务的间隔（秒）
+    TASK_LEASE_MS: int = 60000  # 任务租约时长（毫秒），处理中的任务只有租约过期后才会被其他worker接管
+    TASK_LEASE_RENEW_INTERVAL: float = 15.0  # 持有者续约的间隔（秒），应明显小于租约时长
+
+    # 任务保留与归档配置
+    TASK_TTL_COMPLETED: int = 604800  # 已完成任务的保留时间（秒），0表示不过期
+    TASK_TTL_FAILED: int = 604800  # 失败任务的保留时间（秒）
+    TASK_TTL_CANCELLED: int = 86400  # 已取消任务的保留时间（秒）
+    TASK_LIST_MAX_LIMIT: int = 1000  # 任务列表单次最大返回数量
+    TASK_LIST_SCAN_FACTOR: int = 10  # 按状态和模型列出任务时，单次最多扫描 limit 的该倍数个索引条目
+    TASK_ARCHIVE_ENABLED: bool = True  # 是否将结束的任务归档到MinIO，关闭时只清理过期索引
+    TASK_ARCHIVE_AFTER: int = 259200  # 结束超过该时间的任务会被归档到MinIO（秒），应小于保留时间
+    TASK_ARCHIVE_INTERVAL: int = 3600  # 归档任务的运行间隔（秒）
+    TASK_ARCHIVE_BATCH_SIZE: int = 1000  # 每个归档文件包含的最大任务数
+
+    # 模型推理配置
+    MODEL_MAX_CONCURRENCY: int = 0  # 每个模型的最大并发推理数，0表示使用模型声明的值
+    MODEL_MMAP_WEIGHTS: bool = True  # 以内存映射方式加载safetensors权重，worker进程间共享页缓存
+    MODEL_POOL_MEMORY_MB: int = 4096  # 模型池内存预算（MB），超出时淘汰最久未使用的模型，0表示不限制
+    PREPROCESS_BUFFER_CACHE_MB: int = 512  # 每个模型实例缓存的预处理输入缓冲区上限（MB），计入模型池内存
+    MODEL_PRELOAD: List[str] = []  # worker启动时预加载的模型，格式为 "模型ID" 或 "模型ID:变体"
+    API_MODEL_PRELOAD: List[str] = []  # API进程启动时预加载的模型（仅供 /infer 同步推理），非空时API进程会导入torch
+    MODEL_WARMUP_SIZES: List[int] = [512]  # 预加载后预热推理使用的合成图片边长
+
+    # RealESRGAN分块配置
+    REALESRGAN_AUTOTUNE: bool = True  # 按校准结果自动选择分块大小与批大小，关闭时使用固定的 192/4
+    REALESRGAN_MEMORY_BUDGET_MB: int = 2048  # 单个批次推理可用的激活内存（MB）
+    REALESRGAN_CALIBRATION_PATH: str = "models/RealESRGAN/calibration.json"  # 校准表路径，相对路径按项目根目录解析
+    REALESRGAN_PACK_MAX_PIXELS: int = 1048576  # 不超过该像素数的图片在批处理中合并分块推理
+    REALESRGAN_MAX_BATCH_OUTPUT_MB: int = 1024  # 合并推理的一组小图的输出总量上限（MB），超出时拆分为多组依次推理上传
+    REALESRGAN_INPLACE_TRUNK: bool = True  # 使用预分配稠密缓冲区的推理版RRDBNet，权重与原版通用
+    REALESRGAN_FLAT_THRESHOLD: float = 0.0  # 细节评分低于该值的平坦分块用双三次插值代替网络推理，0表示关闭
+    RESULT_PNG_BAND_ROWS: int = 256  # 流式PNG编码每个行带的行数
+    RESULT_PNG_COMPRESS_LEVEL: int = 6  # 流式PNG编码的zlib压缩等级（0-9）
+
+    # 结果缓存配置
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL: int = 86400  # 缓存有效期（秒），需短于MinIO预签名URL有效期
+    RESULT_CACHE_MAX_ENTRIES: int = 100000  # 超出后按最近访问时间淘汰
+    RESULT_CACHE_INFLIGHT_TTL: int = 300  # 进行中计算的锁超时（秒）
+
+    # 批处理配置
+    BATCH_MAX_SIZE: int = 8  # 单次前向推理的最大图片数
+    BATCH_WINDOW_MS: int = 20  # 收集同模型任务的最长等待时间（毫秒）
 
     class Config:
         env_file = ".env"
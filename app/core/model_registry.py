@@ -1,58 +1,356 @@
-from typing import Dict, Type, Optional
+from typing import Any, Dict, Iterator, List, Tuple, Type, Optional
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+import gc
 import importlib
-import pkg_resources
+import io
+import logging
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 
 class BaseModel(ABC):
-    """模型基类"""
+    """
+    模型基类
+
+    同一实例会被多个线程同时调用：推理相关方法不得在实例上保存单次请求的状态，
+    原图尺寸等请求上下文通过参数显式传递。
+    """
+
+    # 单个实例可同时执行的最大推理数，调度方通过 model_registry.acquire 遵守该限制
+    MAX_CONCURRENCY: int = 1
 
     @abstractmethod
     def predict(self, input_data: bytes) -> Dict:
         """执行模型推理"""
         pass
 
+    def predict_batch(self, inputs: List[bytes]) -> List[Dict]:
+        """批量执行模型推理，默认逐个推理，支持批处理的模型可覆盖"""
+        return [self.predict(input_data) for input_data in inputs]
+
+    def decode(self, input_data: bytes) -> Any:
+        """
+        解码并校验单个输入，无法解码时抛出异常
+
+        批处理在推理前逐个调用，损坏的输入只导致对应任务失败；默认不做处理
+        """
+        return input_data
+
+    def predict_decoded(self, decoded: List[Any]) -> List[Dict]:
+        """对 decode 的结果批量推理，默认 decode 不做处理，直接交给 predict_batch"""
+        return self.predict_batch(decoded)
+
+    def split_batch(self, decoded: List[Any]) -> List[List[int]]:
+        """
+        将已解码的批次划分为依次推理的子批次（下标列表）
+
+        每个子批次推理并上传结果后才开始下一个，输出较大的模型可据此限制同时驻留的结果；
+        默认整批一次推理
+        """
+        return [list(range(len(decoded)))]
+
     @abstractmethod
     def preprocess(self, input_data: bytes) -> bytes:
         """预处理输入数据"""
         pass
 
     @abstractmethod
-    def postprocess(self, output_data: bytes) -> Dict:
-        """后处理输出数据"""
+    def postprocess(
+        self, output_data: Any, context: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """后处理输出数据，context 为预处理阶段得到的请求上下文"""
+        pass
+
+    @classmethod
+    def estimate_memory_bytes(cls, variant: str) -> int:
+        """加载前估算模型变体占用的内存（字节），用于模型池腾出空间"""
+        return 0
+
+    def memory_bytes(self) -> int:
+        """已加载模型实际占用的内存（字节）"""
+        return 0
+
+    def release(self):
+        """模型被淘汰时释放权重等资源"""
         pass
 
+    def warmup(self, sizes: List[int]) -> Dict[str, float]:
+        """
+        以合成图片在各分辨率上执行一次推理，预先完成算子选择和显存分配
+
+        Args:
+            sizes: 合成图片的边长列表
+
+        Returns:
+            各分辨率的推理耗时（秒）
+        """
+        import numpy as np
+        from PIL import Image
+
+        rng = np.random.default_rng(0)
+        timings = {}
+        for size in sizes:
+            # 随机噪声，避免平坦分块跳过网络推理
+            pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+            buffer = io.BytesIO()
+            Image.fromarray(pixels).save(buffer, format="PNG")
+
+            start = time.perf_counter()
+            self.predict(buffer.getvalue())
+            timings[f"warmup_{size}"] = round(time.perf_counter() - start, 3)
+        return timings
+
+
+class _PoolEntry:
+    """模型池中的一个已加载实例"""
+
+    __slots__ = ("instance", "size", "in_use")
+
+    def __init__(self, instance: BaseModel, size: int):
+        self.instance = instance
+        self.size = size
+        self.in_use = 0  # 正在使用该实例的调用方数量，使用中的实例不会被淘汰
+
 
 class ModelRegistry:
-    """模型注册中心"""
+    """
+    模型注册中心
+
+    已加载的模型按 (模型ID, 变体) 放在模型池中：首次使用时才加载，
+    加载新模型会超出 MODEL_POOL_MEMORY_MB 时淘汰最久未使用且空闲的模型
+
+    模型类以 "模块:类名" 注册，首次加载模型时才导入，
+    只创建任务的API进程不会导入torch等推理依赖
+    """
 
     def __init__(self):
-        self.models: Dict[str, Type[BaseModel]] = {}
-        self.model_instances: Dict[str, BaseModel] = {}
+        self.models: Dict[str, str] = {}
+        self.model_costs: Dict[str, Dict[str, Tuple[float, float]]] = {}
+        self._classes: Dict[str, Type[BaseModel]] = {}
         self.model_dependencies: Dict[str, Dict[str, str]] = {}
+        self.model_variants: Dict[str, List[str]] = {}
+        self._pool: "OrderedDict[Tuple[str, str], _PoolEntry]" = OrderedDict()
+        self._semaphores: Dict[Tuple[str, str], threading.BoundedSemaphore] = {}
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "load_failures": 0}
+        # 预加载的 (模型ID, 变体) 及其状态：pending/loading/warming/ready/failed
+        self._preload: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
 
     def register_model(
-        self, model_id: str, model_class: Type[BaseModel], dependencies: Dict[str, str]
+        self,
+        model_id: str,
+        model_class: str,
+        dependencies: Dict[str, str],
+        variants: Optional[List[str]] = None,
+        costs: Optional[Dict[str, Tuple[float, float]]] = None,
     ):
-        """注册模型"""
+        """
+        注册模型
+
+        Args:
+            model_id: 模型ID
+            model_class: 模型类的导入路径 "模块:类名"，以变体名作为唯一构造参数
+            dependencies: 依赖包版本
+            variants: 该模型ID支持的变体，第一个为默认变体；为空时以无参方式构造
+            costs: 各变体的 (每张图片耗时, 每百万输入像素耗时)，单位秒，用于准入控制
+        """
         self.models[model_id] = model_class
         self.model_dependencies[model_id] = dependencies
+        self.model_variants[model_id] = list(variants or [])
+        self.model_costs[model_id] = dict(costs or {})
+
+    def _model_class(self, model_id: str) -> Type[BaseModel]:
+        """导入并缓存模型类"""
+        model_class = self._classes.get(model_id)
+        if model_class is None:
+            module_name, _, class_name = self.models[model_id].partition(":")
+            model_class = getattr(importlib.import_module(module_name), class_name)
+            self._classes[model_id] = model_class
+        return model_class
 
-    def create_model_instance(self, model_id: str) -> BaseModel:
-        """创建模型实例"""
+    def has_model(self, model_id: str) -> bool:
+        """检查模型是否已注册"""
+        return model_id in self.models
+
+    def resolve_variant(self, model_id: str, variant: str = "") -> str:
+        """将任务中的变体解析为模型实际加载的变体，未指定时使用默认变体"""
         if model_id not in self.models:
             raise ValueError(f"Model {model_id} not found")
 
-        if model_id not in self.model_instances:
-            # 检查依赖版本
-            self._check_dependencies(model_id)
-            # 创建实例
-            self.model_instances[model_id] = self.models[model_id]()
+        variants = self.model_variants[model_id]
+        if not variants:
+            return ""
+        if not variant:
+            return variants[0]
+        if variant not in variants:
+            raise ValueError(f"Model {model_id} does not support variant {variant}")
+        return variant
+
+    @property
+    def memory_budget(self) -> int:
+        """模型池内存预算（字节），0表示不限制"""
+        return settings.MODEL_POOL_MEMORY_MB * 1024 * 1024
+
+    def create_model_instance(self, model_id: str, variant: str = "") -> BaseModel:
+        """
+        获取模型实例，未加载时加载到模型池
+
+        返回的实例不计入使用中，可能随后被淘汰；执行推理请使用 acquire
+        """
+        key = (model_id, self.resolve_variant(model_id, variant))
+        instance = self._checkout(key)
+        self._checkin(key)
+        return instance
+
+    def _checkout(self, key: Tuple[str, str]) -> BaseModel:
+        """取出模型实例并标记为使用中，必要时加载"""
+        with self._lock:
+            entry = self._pool.get(key)
+            if entry is not None:
+                self._pool.move_to_end(key)
+                entry.in_use += 1
+                self._stats["hits"] += 1
+                return entry.instance
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # 同一模型只加载一次，加载期间不阻塞其他模型的命中
+        with load_lock:
+            with self._lock:
+                entry = self._pool.get(key)
+                if entry is not None:
+                    self._pool.move_to_end(key)
+                    entry.in_use += 1
+                    self._stats["hits"] += 1
+                    return entry.instance
 
-        return self.model_instances[model_id]
+                model_id, variant = key
+                model_class = self._model_class(model_id)
+                # 加载前先按估算大小腾出空间
+                self._evict(model_class.estimate_memory_bytes(variant))
+
+            try:
+                instance = self._load(model_id, variant)
+            except Exception:
+                with self._lock:
+                    self._stats["load_failures"] += 1
+                raise
+
+            with self._lock:
+                entry = _PoolEntry(instance, instance.memory_bytes())
+                entry.in_use = 1
+                self._pool[key] = entry
+                self._stats["loads"] += 1
+                # 以实际大小再检查一次预算
+                self._evict(0)
+
+            logger.info(
+                f"Loaded model {model_id}[{variant}] "
+                f"({entry.size / 1024 / 1024:.1f}MB, pool {self.memory_used() / 1024 / 1024:.1f}MB)"
+            )
+            return instance
+
+    def _checkin(self, key: Tuple[str, str]):
+        """归还模型实例，并按实际占用更新大小（推理期间分配的缓存也计入模型池预算）"""
+        with self._lock:
+            entry = self._pool.get(key)
+            if entry is not None:
+                entry.in_use -= 1
+                entry.size = entry.instance.memory_bytes()
+
+    def _load(self, model_id: str, variant: str) -> BaseModel:
+        """检查依赖并构造模型实例"""
+        # 检查依赖版本
+        self._check_dependencies(model_id)
+        model_class = self._model_class(model_id)
+        return model_class(variant) if variant else model_class()
+
+    def _evict(self, incoming: int):
+        """按最久未使用顺序淘汰空闲模型，直到可以再放入 incoming 字节（需持有锁）"""
+        budget = self.memory_budget
+        if budget <= 0:
+            return
+
+        used = self.memory_used()
+        for key in list(self._pool):
+            if used + incoming <= budget:
+                break
+            entry = self._pool[key]
+            if entry.in_use > 0:
+                continue
+
+            del self._pool[key]
+            used -= entry.size
+            self._stats["evictions"] += 1
+            logger.info(
+                f"Evicted model {key[0]}[{key[1]}] ({entry.size / 1024 / 1024:.1f}MB)"
+            )
+            try:
+                entry.instance.release()
+            except Exception as e:
+                logger.error(f"Failed to release model {key[0]}[{key[1]}]: {str(e)}")
+
+        if used + incoming > budget:
+            logger.warning(
+                f"Model pool over budget: {(used + incoming) / 1024 / 1024:.1f}MB "
+                f"> {settings.MODEL_POOL_MEMORY_MB}MB, all other models are in use"
+            )
+        gc.collect()
+
+    def memory_used(self) -> int:
+        """模型池中已加载模型的内存总量（字节）"""
+        return sum(entry.size for entry in self._pool.values())
+
+    def estimate_cost(self, model_id: str, variant: str, pixels: int) -> float:
+        """预估模型变体处理一张 pixels 像素图片的推理耗时（秒），未登记耗时的变体按每百万像素1秒估算"""
+        variant = self.resolve_variant(model_id, variant)
+        per_image, per_mpixel = self.model_costs[model_id].get(variant, (0.0, 1.0))
+        return per_image + per_mpixel * pixels / 1_000_000
+
+    def get_max_concurrency(self, model_id: str) -> int:
+        """模型允许的最大并发推理数，MODEL_MAX_CONCURRENCY 大于0时统一覆盖模型声明"""
+        if settings.MODEL_MAX_CONCURRENCY > 0:
+            return settings.MODEL_MAX_CONCURRENCY
+        return max(1, self._model_class(model_id).MAX_CONCURRENCY)
+
+    def _get_semaphore(self, key: Tuple[str, str]) -> threading.BoundedSemaphore:
+        with self._lock:
+            if key not in self._semaphores:
+                self._semaphores[key] = threading.BoundedSemaphore(
+                    self.get_max_concurrency(key[0])
+                )
+            return self._semaphores[key]
+
+    @contextmanager
+    def acquire(self, model_id: str, variant: str = "") -> Iterator[BaseModel]:
+        """
+        获取模型实例并占用一个推理名额，超出模型最大并发数时阻塞等待；
+        使用期间实例不会被模型池淘汰
+
+        用法::
+
+            with model_registry.acquire(model_id, variant) as model:
+                results = model.predict_batch(inputs)
+        """
+        key = (model_id, self.resolve_variant(model_id, variant))
+
+        semaphore = self._get_semaphore(key)
+        with semaphore:
+            instance = self._checkout(key)
+            try:
+                yield instance
+            finally:
+                self._checkin(key)
 
     def _check_dependencies(self, model_id: str):
         """检查模型依赖版本"""
+        import pkg_resources  # 导入较慢，只在加载模型时需要
+
         dependencies = self.model_dependencies.get(model_id, {})
         for package, version in dependencies.items():
             try:
@@ -62,20 +360,114 @@ class ModelRegistry:
             except pkg_resources.DistributionNotFound:
                 raise ValueError(f"Package {package} not found")
 
-    def get_model(self, model_id: str) -> Optional[BaseModel]:
-        """获取模型实例"""
-        return self.model_instances.get(model_id)
+    def preload(self, specs: List[str], warmup_sizes: List[int]):
+        """
+        依次加载并预热配置的模型，状态通过 readiness 查询
+
+        Args:
+            specs: "模型ID" 或 "模型ID:变体" 列表
+            warmup_sizes: 预热推理使用的合成图片边长
+        """
+        self.run_preload(self.register_preload(specs), warmup_sizes)
+
+    def register_preload(self, specs: List[str]) -> List[Tuple[str, str]]:
+        """
+        将配置的模型登记为待预加载，登记后 readiness 在预热完成前返回未就绪
+
+        在后台线程中预加载时须先在启动流程中同步登记，
+        否则线程开始前的就绪检查会因没有登记任何模型而通过
+        """
+        keys = []
+        with self._lock:
+            for spec in specs:
+                model_id, _, variant = spec.strip().partition(":")
+                key = (model_id, variant)
+                self._preload[key] = {"state": "pending"}
+                keys.append(key)
+        return keys
+
+    def run_preload(self, keys: List[Tuple[str, str]], warmup_sizes: List[int]):
+        """依次加载并预热 register_preload 登记的模型"""
+        for model_id, variant in keys:
+            status = self._preload[(model_id, variant)]
+            start = time.perf_counter()
+            try:
+                variant = self.resolve_variant(model_id, variant)
+                status["state"] = "loading"
+                with self.acquire(model_id, variant) as model:
+                    status["state"] = "warming"
+                    warmup_timings = model.warmup(warmup_sizes)
+                status.update(
+                    state="ready",
+                    variant=variant,
+                    load_timings={
+                        **getattr(model, "load_timings", {}),
+                        **warmup_timings,
+                    },
+                )
+                logger.info(f"Preloaded model {model_id}[{variant}]")
+            except Exception as e:
+                status.update(state="failed", error=str(e))
+                logger.error(f"Failed to preload model {model_id}[{variant}]: {str(e)}")
+            finally:
+                status["seconds"] = round(time.perf_counter() - start, 3)
+
+    def readiness(self) -> Dict[str, Any]:
+        """预加载模型的状态；所有模型预热完成（或未配置预加载）时 ready 为 True"""
+        with self._lock:
+            models = []
+            for (model_id, variant), status in self._preload.items():
+                variant = status.get("variant", variant)
+                models.append(
+                    {
+                        "model_id": model_id,
+                        "variant": variant,
+                        **status,
+                        # 预热后仍可能因内存预算被淘汰，下次使用时重新加载
+                        "loaded": (model_id, variant) in self._pool,
+                    }
+                )
+        return {
+            "ready": all(model["state"] == "ready" for model in models),
+            "models": models,
+        }
+
+    def get_model(self, model_id: str, variant: str = "") -> Optional[BaseModel]:
+        """获取已加载的模型实例，未加载时返回None"""
+        key = (model_id, self.resolve_variant(model_id, variant))
+        entry = self._pool.get(key)
+        return entry.instance if entry else None
 
     def list_models(self) -> Dict[str, Dict]:
         """列出所有可用模型"""
         return {
             model_id: {
-                "class": model_class.__name__,
+                "class": model_class.rpartition(":")[2],
+                "variants": self.model_variants.get(model_id, []),
                 "dependencies": self.model_dependencies.get(model_id, {}),
             }
             for model_id, model_class in self.models.items()
         }
 
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """模型池的加载/淘汰计数及当前已加载的模型"""
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_used_mb": round(self.memory_used() / 1024 / 1024, 1),
+                "memory_budget_mb": settings.MODEL_POOL_MEMORY_MB,
+                "loaded": [
+                    {
+                        "model_id": model_id,
+                        "variant": variant,
+                        "memory_mb": round(entry.size / 1024 / 1024, 1),
+                        "in_use": entry.in_use,
+                        "load_timings": getattr(entry.instance, "load_timings", {}),
+                    }
+                    for (model_id, variant), entry in self._pool.items()
+                ],
+            }
+
 
 # 创建全局模型注册中心
 model_registry = ModelRegistry()
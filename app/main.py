@@ -1,6 +1,12 @@
+import threading
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api import tasks, matting, upscale
+from app.core.model_registry import model_registry
+from app.services.admission import admission_controller
+from app.core.config import settings
+import app.models  # noqa: F401  确保模型已注册
 
 app = FastAPI(title="AI Service", description="AI模型服务API", version="1.0.0")
 
@@ -19,6 +25,20 @@ app.include_router(matting.router, prefix="/api/v1/matting", tags=["matting"])
 app.include_router(upscale.router, prefix="/api/v1/upscale", tags=["upscale"])
 
 
+@app.on_event("startup")
+def preload_models():
+    """在后台线程中预加载并预热 /infer 使用的模型，完成前 /ready 返回503"""
+    if settings.API_MODEL_PRELOAD:
+        # 先同步登记为待加载，线程开始前到达的就绪检查同样返回503
+        keys = model_registry.register_preload(settings.API_MODEL_PRELOAD)
+        threading.Thread(
+            target=model_registry.run_preload,
+            args=(keys, settings.MODEL_WARMUP_SIZES),
+            name="model-preload",
+            daemon=True,
+        ).start()
+
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to AI Service"}
@@ -27,3 +47,20 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """就绪检查：配置的模型全部加载并预热后返回200，否则返回503"""
+    readiness = model_registry.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/models")
+async def list_models():
+    """已注册的模型、本进程模型池的加载/淘汰统计及各模型清空队列的预估时间"""
+    return {
+        "models": model_registry.list_models(),
+        "pool": model_registry.get_pool_stats(),
+        "drain_seconds": await admission_controller.get_drain_times(),
+    }
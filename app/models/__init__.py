@@ -1,6 +1,8 @@
 from app.core.model_registry import model_registry
-from app.models.birefnet_model import BiRefNetModel
-from app.models.realesrgan_model import RealESRGANModel
+
+# 模型类以导入路径注册，首次加载模型时才导入，API进程不依赖torch
+BIREFNET_CLASS = "app.models.birefnet_model:BiRefNetModel"
+REALESRGAN_CLASS = "app.models.realesrgan_model:RealESRGANModel"
 
 # 共享的依赖配置
 BIREFNET_DEPS = {
@@ -20,22 +22,30 @@ BIREFNET_DEPS = {
 }
 
 # 注册所有BiRefNet模型变体
+# 每个模型ID绑定对应的权重变体
+# 输入统一缩放到模型输入尺寸，推理耗时与原图像素数无关：1024输入约0.5秒，2048输入约2秒
 model_registry.register_model(
     "birefnet",
-    BiRefNetModel,
+    BIREFNET_CLASS,
     BIREFNET_DEPS,
+    variants=["default"],
+    costs={"default": (0.5, 0.0)},
 )
 
 model_registry.register_model(
     "birefnet-hr",
-    BiRefNetModel,
+    BIREFNET_CLASS,
     BIREFNET_DEPS,
+    variants=["hr"],
+    costs={"hr": (2.0, 0.0)},
 )
 
 model_registry.register_model(
     "birefnet-portrait",
-    BiRefNetModel,
+    BIREFNET_CLASS,
     BIREFNET_DEPS,
+    variants=["portrait"],
+    costs={"portrait": (0.5, 0.0)},
 )
 
 # RealESRGAN模型依赖配置
@@ -48,9 +58,12 @@ REALESRGAN_DEPS = {
     "huggingface-hub": "0.29.3",
 }
 
-# 注册RealESRGAN模型
+# 注册RealESRGAN模型，按任务的变体加载 x2/x4/x8 权重，默认x4
+# 网络主体在输入分辨率上计算，按输入像素数估算，倍率越大上采样部分耗时越多
 model_registry.register_model(
     "realesrgan",
-    RealESRGANModel,
+    REALESRGAN_CLASS,
     REALESRGAN_DEPS,
+    variants=["x4", "x2", "x8"],
+    costs={"x2": (0.0, 5.0), "x4": (0.0, 6.0), "x8": (0.0, 8.0)},
 )
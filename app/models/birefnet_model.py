@@ -1,8 +1,7 @@
 import torch
 from PIL import Image
-import torchvision.transforms as transforms
 import numpy as np
-from typing import Dict, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import io
 import os
 import sys
@@ -15,11 +14,19 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 from app.core.model_registry import BaseModel
+from app.core.config import settings
+from app.utils.safetensors_mmap import load_into_module
+from app.utils.fast_init import no_init_weights, LoadTimer
+from app.utils.image_preprocess import ImagePreprocessor
+import models.BiRefNet.birefnet as birefnet_module
 from models.BiRefNet.birefnet import BiRefNet
 from models.BiRefNet.BiRefNet_config import BiRefNetConfig
 
 
 class BiRefNetModel(BaseModel):
+    # 推理不修改实例状态，前向计算可在多个线程中并发执行
+    MAX_CONCURRENCY = 2
+
     # 模型配置
     MODEL_CONFIG = {
         "default": {
@@ -48,6 +55,9 @@ class BiRefNetModel(BaseModel):
             raise ValueError(f"不支持的模型类型: {model_type}")
 
         self.size = self.config["size"]
+        self.preprocessor = ImagePreprocessor(
+            self.size, max_cached_bytes=settings.PREPROCESS_BUFFER_CACHE_MB * 1024 * 1024
+        )
         self.model = self._load_model()
 
     def _load_model(self) -> BiRefNet:
@@ -56,85 +66,119 @@ class BiRefNetModel(BaseModel):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
 
-        # 禁用预训练权重加载
-        config = BiRefNetConfig(bb_pretrained=False)
-        model = BiRefNet(config=config)
+        timer = LoadTimer()
 
-        # 使用safetensors加载模型权重
-        state_dict = load_file(model_path)  # 先加载到CPU
-        model.load_state_dict(state_dict)
+        # 禁用预训练权重加载；随机初始化会被checkpoint完全覆盖，构造时跳过
+        with timer.stage("construct"), no_init_weights(
+            extra_targets=((birefnet_module, "trunc_normal_"),)
+        ):
+            config = BiRefNetConfig(bb_pretrained=False)
+            model = BiRefNet(config=config)
+
+        with timer.stage("load"):
+            if settings.MODEL_MMAP_WEIGHTS:
+                # 参数直接引用内存映射的权重文件，同一主机上的worker共享页缓存
+                load_into_module(model, model_path)
+            else:
+                # 使用safetensors加载模型权重
+                state_dict = load_file(model_path)  # 先加载到CPU
+                model.load_state_dict(state_dict)
 
         # 将模型移到设备上并设置为评估模式
-        model = model.to(self.device)
-        model.eval()
+        with timer.stage("to_device"):
+            model = model.to(self.device)
+            model.eval()
+
+        self.load_timings = timer.timings
+        timer.log(f"BiRefNet[{self.model_type}]")
         return model
 
-    def preprocess(self, input_data: bytes) -> bytes:
-        """预处理输入图像"""
-        # 读取图像
-        image = Image.open(io.BytesIO(input_data)).convert("RGB")
-
-        # 预处理
-        transform = transforms.Compose(
-            [
-                transforms.Resize((self.size, self.size)),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
+    @classmethod
+    def estimate_memory_bytes(cls, variant: str) -> int:
+        """以权重文件大小估算模型占用的内存"""
+        config = cls.MODEL_CONFIG.get(variant or "default")
+        if not config or not os.path.exists(config["path"]):
+            return 0
+        return os.path.getsize(config["path"])
+
+    def memory_bytes(self) -> int:
+        """模型参数与缓冲区占用的内存，以及缓存的预处理输入缓冲区"""
+        return self.preprocessor.memory_bytes() + sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in list(self.model.parameters()) + list(self.model.buffers())
         )
 
-        # 保存原始大小
-        self.original_size = image.size
+    def release(self):
+        """释放模型权重和预处理缓冲区"""
+        self.preprocessor.release()
+        del self.model
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
 
-        # 转换图像
-        image_tensor = transform(image)
-        image_tensor = image_tensor.unsqueeze(0)
+    def preprocess(self, input_data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        预处理输入图像
 
-        # 转换为字节
+        Returns:
+            (序列化的输入张量, 请求上下文)，上下文包含原始尺寸，需传给 postprocess
+        """
+        input_tensor, original_sizes = self.preprocessor.prepare([input_data])
+
+        # 转换为字节；输入缓冲区会被复用，序列化前先复制
         buffer = io.BytesIO()
-        torch.save(image_tensor, buffer)
-        return buffer.getvalue()
+        torch.save(input_tensor.clone(), buffer)
+        return buffer.getvalue(), {"original_size": original_sizes[0]}
 
     def predict(self, input_data: bytes) -> Dict:
         """执行模型推理"""
-        # 将字节数据转换为图像
-        image = Image.open(io.BytesIO(input_data)).convert("RGB")
-
-        # 预处理图像
-        transform = transforms.Compose(
-            [
-                transforms.Resize((self.size, self.size)),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
-        )
+        return self.predict_batch([input_data])[0]
 
-        # 转换图像
-        input_tensor = transform(image)
-        input_tensor = input_tensor.unsqueeze(0)
-        input_tensor = input_tensor.to(self.device)
+    def predict_batch(self, inputs: List[bytes]) -> List[Dict]:
+        """批量推理：将多张图片堆叠为 [B,3,size,size] 做一次前向计算"""
+        return self.predict_decoded([self.decode(input_data) for input_data in inputs])
+
+    def decode(self, input_data: bytes) -> Tuple[Image.Image, Tuple[int, int]]:
+        """解码并缩放到模型输入尺寸，返回 (图像, 原始尺寸)"""
+        return self.preprocessor.decode(input_data)
 
-        # 保存原始大小
-        self.original_size = image.size
+    def predict_decoded(
+        self, decoded: List[Tuple[Image.Image, Tuple[int, int]]]
+    ) -> List[Dict]:
+        """对已解码的图片做一次批量前向计算"""
+        input_tensor, original_sizes = self.preprocessor.stack(decoded)
+        input_tensor = input_tensor.to(self.device)
 
         # 执行推理
         with torch.no_grad():
             output = self.model(input_tensor)
 
-        # 后处理
-        return self.postprocess(output)
+        if isinstance(output, list):
+            output = output[0]
+
+        # 按原图尺寸分别后处理
+        return [
+            self._postprocess_mask(output[i : i + 1], original_size)
+            for i, original_size in enumerate(original_sizes)
+        ]
+
+    def postprocess(
+        self, output_data: torch.Tensor, context: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """后处理预测的mask，context 中的 original_size 为输出尺寸"""
+        if not context or "original_size" not in context:
+            raise ValueError("postprocess requires original_size in context")
 
-    def postprocess(self, output_data: torch.Tensor) -> Dict:
-        """后处理预测的mask"""
         # 处理输出
         if isinstance(output_data, list):
             # 如果输出是列表，取第一个元素
             output_data = output_data[0]
 
+        return self._postprocess_mask(output_data, context["original_size"])
+
+    def _postprocess_mask(
+        self, output_data: torch.Tensor, original_size: Tuple[int, int]
+    ) -> Dict:
+        """将单张图片的输出转换为原始尺寸的PNG mask"""
         # 确保输出是tensor
         if not isinstance(output_data, torch.Tensor):
             raise ValueError(f"Unexpected output type: {type(output_data)}")
@@ -144,7 +188,7 @@ class BiRefNetModel(BaseModel):
         mask = (mask > 0.5).astype(np.uint8) * 255
 
         # 调整大小
-        mask = Image.fromarray(mask).resize(self.original_size, Image.BILINEAR)
+        mask = Image.fromarray(mask).resize(original_size, Image.BILINEAR)
 
         # 转换为字节
         buffer = io.BytesIO()
@@ -1,7 +1,7 @@
 import torch
 from PIL import Image
 import numpy as np
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import io
 import os
 import sys
@@ -13,10 +13,16 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 from app.core.model_registry import BaseModel
+from app.utils.fast_init import no_init_weights, LoadTimer
+from app.core.config import settings
 from models.RealESRGAN.model import RealESRGAN
+from models.RealESRGAN.autotune import TileAutoTuner
 
 
 class RealESRGANModel(BaseModel):
+    # 推理不修改实例状态；超分显存占用较大，并发数保持较低
+    MAX_CONCURRENCY = 2
+
     # 模型配置
     MODEL_CONFIG = {
         "x2": {
@@ -49,6 +55,14 @@ class RealESRGANModel(BaseModel):
             raise ValueError(f"不支持的模型类型: {model_type}")
 
         self.scale = self.config["scale"]
+        # 相对路径与权重文件一样按项目根目录解析，不随worker的启动目录变化；为空时不持久化
+        calibration_path = settings.REALESRGAN_CALIBRATION_PATH
+        if calibration_path:
+            calibration_path = os.path.join(project_root, calibration_path)
+        self.tuner = TileAutoTuner(
+            calibration_path,
+            settings.REALESRGAN_MEMORY_BUDGET_MB * 1024 * 1024,
+        )
         self.model = self._load_model()
 
     def _load_model(self) -> RealESRGAN:
@@ -57,44 +71,182 @@ class RealESRGANModel(BaseModel):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
 
-        # 创建模型实例
-        model = RealESRGAN(device=self.device, scale=self.scale)
+        timer = LoadTimer()
+
+        # 创建模型实例；随机初始化会被checkpoint完全覆盖，构造时跳过
+        with timer.stage("construct"), no_init_weights():
+            model = RealESRGAN(
+                device=self.device,
+                scale=self.scale,
+                inplace=settings.REALESRGAN_INPLACE_TRUNK,
+            )
 
         # 加载权重
-        model.load_weights(model_path, download=False)
+        with timer.stage("load"):
+            model.load_weights(model_path, download=False, to_device=False)
+
+        with timer.stage("to_device"):
+            model.model.to(self.device)
 
+        if settings.REALESRGAN_AUTOTUNE and self.tuner.calibration(self.device, self.scale) is None:
+            # 首次在该设备上加载该倍率时测量一次，结果写入校准文件供后续进程复用
+            with timer.stage("calibrate"):
+                self.tuner.ensure_calibrated(model.model, self.device, self.scale)
+
+        self.load_timings = timer.timings
+        timer.log(f"RealESRGAN[{self.model_type}]")
         return model
 
-    def preprocess(self, input_data: bytes) -> bytes:
-        """预处理输入图像"""
+    @classmethod
+    def estimate_memory_bytes(cls, variant: str) -> int:
+        """以权重文件大小估算模型占用的内存"""
+        config = cls.MODEL_CONFIG.get(variant or "x4")
+        if not config or not os.path.exists(config["path"]):
+            return 0
+        return os.path.getsize(config["path"])
+
+    def memory_bytes(self) -> int:
+        """模型参数与缓冲区占用的内存"""
+        network = self.model.model
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in list(network.parameters()) + list(network.buffers())
+        )
+
+    def release(self):
+        """释放模型权重"""
+        del self.model
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+
+    def preprocess(self, input_data: bytes) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        预处理输入图像
+
+        Returns:
+            (PNG编码的RGB图像, 请求上下文)
+        """
         # 读取图像
         image = Image.open(io.BytesIO(input_data)).convert("RGB")
 
-        # 保存原始大小
-        self.original_size = image.size
-
         # 转换为字节
         buffer = io.BytesIO()
         image.save(buffer, format="PNG")
-        return buffer.getvalue()
+        return buffer.getvalue(), {"original_size": image.size}
 
     def predict(self, input_data: bytes) -> Dict:
         """执行模型推理"""
-        # 将字节数据转换为图像
-        image = Image.open(io.BytesIO(input_data)).convert("RGB")
-
-        # 执行推理
-        sr_image = self.model.predict(image)
-
-        # 转换为字节
-        buffer = io.BytesIO()
-        sr_image.save(buffer, format="PNG")
+        return self._predict_image(self.decode(input_data))
+
+    def decode(self, input_data: bytes) -> Image.Image:
+        """完整解码为RGB图像，截断或损坏的图片在此抛出异常"""
+        return Image.open(io.BytesIO(input_data)).convert("RGB")
+
+    def _predict_image(self, image: Image.Image) -> Dict:
+        """单张图片按自身尺寸规划分块并推理"""
+        # 按图片尺寸、倍率和内存预算选择分块大小与批大小
+        plan = (
+            self.tuner.plan(image.height, image.width, self.device, self.scale)
+            if settings.REALESRGAN_AUTOTUNE
+            else {}
+        )
+
+        # 执行推理；输出保持为uint8数组，由结果处理器按行带流式编码上传，
+        # 避免同时持有原始图像、完整PNG和上传缓冲区
+        stats: Dict[str, int] = {}
+        sr_image = self.model.predict_array(
+            image,
+            flat_threshold=settings.REALESRGAN_FLAT_THRESHOLD,
+            stats=stats,
+            **plan,
+        )
 
         return {
-            "result_image": buffer.getvalue(),
+            "result_array": sr_image,
+            "skipped_tile_ratio": self._skipped_ratio(stats),
         }
 
-    def postprocess(self, output_data: Dict) -> Dict:
+    def predict_batch(self, inputs: List[bytes]) -> List[Dict]:
+        """批量推理，见 predict_decoded"""
+        return self.predict_decoded([self.decode(input_data) for input_data in inputs])
+
+    def split_batch(self, images: List[Image.Image]) -> List[List[int]]:
+        """
+        大图各自单独推理；小图合并推理，每组的输出总量不超过 REALESRGAN_MAX_BATCH_OUTPUT_MB
+
+        子批次依次推理并上传，同时驻留内存的输出数组不超过一个大图或一组小图
+        """
+        max_bytes = settings.REALESRGAN_MAX_BATCH_OUTPUT_MB * 1024 * 1024
+        batches: List[List[int]] = []
+        group: List[int] = []
+        group_bytes = 0
+        for i, image in enumerate(images):
+            pixels = image.width * image.height
+            if pixels > settings.REALESRGAN_PACK_MAX_PIXELS:
+                batches.append([i])
+                continue
+
+            output_bytes = pixels * self.scale * self.scale * 3
+            if group and group_bytes + output_bytes > max_bytes:
+                batches.append(group)
+                group, group_bytes = [], 0
+            group.append(i)
+            group_bytes += output_bytes
+        if group:
+            batches.append(group)
+        return batches
+
+    def predict_decoded(self, images: List[Image.Image]) -> List[Dict]:
+        """
+        批量推理：小图的分块合并到同一组批次中推理，输出按分块来源写回各自的结果
+
+        超过 REALESRGAN_PACK_MAX_PIXELS 的大图单独推理，使用各自的分块规划
+        """
+        results: List[Optional[Dict]] = [None] * len(images)
+        small = []
+        for i, image in enumerate(images):
+            if image.width * image.height <= settings.REALESRGAN_PACK_MAX_PIXELS:
+                small.append((i, image))
+            else:
+                results[i] = self._predict_image(image)
+
+        if small:
+            # 同一批次的图片使用相同的分块大小，分块才能堆叠为一个张量
+            plan = (
+                self.tuner.plan_batch(
+                    [(image.height, image.width) for _, image in small],
+                    self.device,
+                    self.scale,
+                )
+                if settings.REALESRGAN_AUTOTUNE
+                else {}
+            )
+            stats: Dict[str, int] = {}
+            arrays = self.model.predict_arrays(
+                [image for _, image in small],
+                flat_threshold=settings.REALESRGAN_FLAT_THRESHOLD,
+                stats=stats,
+                **plan,
+            )
+            # 跳过比例按每张图片自己的分块统计
+            for (i, _), sr_image, image_stats in zip(small, arrays, stats["images"]):
+                results[i] = {
+                    "result_array": sr_image,
+                    "skipped_tile_ratio": self._skipped_ratio(image_stats),
+                }
+
+        return results
+
+    @staticmethod
+    def _skipped_ratio(stats: Dict[str, int]) -> float:
+        """跳过网络推理的平坦分块占比"""
+        if not stats.get("tiles"):
+            return 0.0
+        return round(stats["skipped"] / stats["tiles"], 4)
+
+    def postprocess(
+        self, output_data: Dict, context: Optional[Dict[str, Any]] = None
+    ) -> Dict:
         """后处理预测结果"""
         # 对于超分辨率任务，预测结果已经是最终结果
         return output_data
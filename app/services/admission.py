@@ -0,0 +1,94 @@
+import math
+import logging
+from typing import Dict, List
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.model_registry import model_registry
+from app.utils.minio_client import minio_client
+from app.utils.redis_client import async_redis_client, TaskRejected
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """排队中的推理耗时超过 ADMISSION_MAX_DRAIN_SECONDS，请求被拒绝"""
+
+    def __init__(self, model_id: str, retry_after: int):
+        super().__init__(f"Model {model_id} is overloaded, retry after {retry_after}s")
+        self.model_id = model_id
+        self.retry_after = retry_after
+
+    def to_http_exception(self) -> HTTPException:
+        return HTTPException(
+            status_code=429,
+            detail=f"模型 {self.model_id} 当前排队任务过多，请 {self.retry_after} 秒后重试",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class AdmissionController:
+    """
+    准入控制：按模型和输入像素数估算每个任务的推理耗时，
+    Redis中按模型累计未完成任务的耗时（创建时增加，结束/取消/删除时扣除）。
+
+    模型的排队耗时除以 ADMISSION_WORKER_SLOTS 即为清空队列所需的时间，
+    新任务会使其超过 ADMISSION_MAX_DRAIN_SECONDS 时拒绝，并按超出部分计算 Retry-After。
+    单任务的检查与计入在创建脚本中原子完成。
+    """
+
+    @property
+    def max_queued_cost(self) -> float:
+        """每个模型允许的排队耗时上限（秒），0表示不限制"""
+        if not settings.ADMISSION_ENABLED:
+            return 0.0
+        return settings.ADMISSION_MAX_DRAIN_SECONDS * settings.ADMISSION_WORKER_SLOTS
+
+    def retry_after(self, excess: float) -> int:
+        """排队耗时超出上限 excess 秒时，等待队列消化所需的秒数"""
+        return max(1, math.ceil(excess / settings.ADMISSION_WORKER_SLOTS))
+
+    def rejected(self, error: TaskRejected) -> AdmissionRejected:
+        logger.warning(str(error))
+        return AdmissionRejected(error.model_id, self.retry_after(error.excess))
+
+    async def estimate_costs(
+        self, file_urls: List[str], model_id: str, variant: str = ""
+    ) -> List[float]:
+        """
+        估算各文件的推理耗时（秒）
+
+        像素数取自上传时记录的文件元信息，未通过上传接口的文件按 ADMISSION_DEFAULT_PIXELS 估算
+        """
+        metas = await async_redis_client.get_files_meta(
+            [minio_client.object_name(file_url) for file_url in file_urls]
+        )
+        return [
+            model_registry.estimate_cost(
+                model_id,
+                variant,
+                meta[0] * meta[1] if meta else settings.ADMISSION_DEFAULT_PIXELS,
+            )
+            * settings.ADMISSION_COST_FACTOR
+            for meta in metas
+        ]
+
+    async def check(self, model_id: str, cost: float):
+        """批量提交前检查总耗时，超出上限时抛出 AdmissionRejected"""
+        limit = self.max_queued_cost
+        if limit <= 0:
+            return
+
+        queued = (await async_redis_client.get_queued_costs()).get(model_id, 0.0)
+        if queued > 0 and queued + cost > limit:
+            raise self.rejected(TaskRejected(model_id, queued + cost - limit))
+
+    async def get_drain_times(self) -> Dict[str, float]:
+        """各模型清空当前队列的预估时间（秒）"""
+        costs = await async_redis_client.get_queued_costs()
+        return {
+            model_id: round(cost / settings.ADMISSION_WORKER_SLOTS, 3)
+            for model_id, cost in costs.items()
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import logging
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from PIL import Image
+from app.core.config import settings
+from app.core.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceService:
+    """
+    同步推理：请求体即图片，在API进程的模型池上直接推理并返回结果
+
+    不经过MinIO上传、任务队列和轮询，适用于交互场景下的小图。
+    同时进行的推理数受 INFER_MAX_CONCURRENCY 限制，推理在线程池中执行，不阻塞事件循环。
+    """
+
+    def __init__(self):
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.INFER_MAX_CONCURRENCY)
+        return self._semaphore
+
+    async def read_image(self, request: Request, max_pixels: int) -> bytes:
+        """
+        读取请求体中的图片，超过大小或像素数限制时返回413
+
+        Args:
+            request: 请求，body为图片的原始字节
+            max_pixels: 允许的最大输入像素数
+        """
+        content_type = request.headers.get("content-type", "")
+        if not content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的文件类型: {content_type}，请求体需为图片",
+            )
+
+        too_large = HTTPException(
+            status_code=413,
+            detail="图片超过同步推理的大小限制，请上传后通过 /process 创建异步任务",
+        )
+
+        # 声明的长度超限时不读取请求体
+        content_length = request.headers.get("content-length")
+        if content_length:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="无效的 Content-Length")
+            if declared > settings.INFER_MAX_BYTES:
+                raise too_large
+
+        chunks = []
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.INFER_MAX_BYTES:
+                raise too_large
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        if not data:
+            raise HTTPException(status_code=400, detail="请求体为空")
+
+        # 只解析图片头获取尺寸，不解码像素
+        try:
+            width, height = Image.open(io.BytesIO(data)).size
+        except Exception:
+            raise HTTPException(status_code=400, detail="无法识别的图片格式")
+        if width * height > max_pixels:
+            raise too_large
+
+        return data
+
+    async def infer(self, model_id: str, variant: str, data: bytes) -> Dict[str, Any]:
+        """
+        在推理名额内执行单张图片推理
+
+        等待名额超过 INFER_QUEUE_TIMEOUT 秒时返回503
+        """
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), settings.INFER_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="同步推理繁忙，请稍后重试或创建异步任务",
+                headers={"Retry-After": "1"},
+            )
+
+        try:
+            return await run_in_threadpool(self._predict, model_id, variant, data)
+        finally:
+            semaphore.release()
+
+    def _predict(self, model_id: str, variant: str, data: bytes) -> Dict[str, Any]:
+        # 与worker共用模型池和每个模型的并发上限
+        with model_registry.acquire(model_id, variant) as model:
+            logger.info(f"Running synchronous inference on {model_id}[{variant}]")
+            return model.predict(data)
+
+
+inference_service = InferenceService()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.redis_client import redis_client, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+# 结果缓存相关的Redis key
+CACHE_KEY_PREFIX = "result_cache:"
+INFLIGHT_KEY_PREFIX = "result_inflight:"
+WAITERS_KEY_PREFIX = "result_waiters:"
+LRU_KEY = "result_cache_lru"
+STATS_KEY = "result_cache_stats"
+
+# 对发起调用的任务hash中的 redis_calls 计数加一，任务不存在时不创建任务hash
+COUNT_CALL_LUA = """
+if redis.call('EXISTS', KEYS[6]) == 1 then
+    redis.call('HINCRBY', KEYS[6], 'redis_calls', 1)
+end
+"""
+
+# KEYS[1]: 结果缓存  KEYS[2]: 进行中锁  KEYS[3]: 等待者列表  KEYS[4]: LRU有序集合  KEYS[5]: 统计hash
+# KEYS[6]: 任务hash
+# ARGV[1]: 任务ID  ARGV[2]: 进行中锁超时（毫秒）  ARGV[3]: 当前时间（毫秒）  ARGV[4]: 内容摘要
+# 返回 {'hit', 结果JSON} / {'leader', ''} / {'follower', 负责计算的任务ID}
+ACQUIRE_SCRIPT = COUNT_CALL_LUA + """
+local cached = redis.call('GET', KEYS[1])
+if cached then
+    redis.call('ZADD', KEYS[4], ARGV[3], ARGV[4])
+    redis.call('HINCRBY', KEYS[5], 'hits', 1)
+    return {'hit', cached}
+end
+local leader = redis.call('GET', KEYS[2])
+if not leader then
+    redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[2])
+    redis.call('HINCRBY', KEYS[5], 'misses', 1)
+    return {'leader', ''}
+end
+if leader == ARGV[1] then
+    return {'leader', ''}
+end
+redis.call('RPUSH', KEYS[3], ARGV[1])
+redis.call('PEXPIRE', KEYS[3], ARGV[2])
+redis.call('HINCRBY', KEYS[5], 'coalesced', 1)
+return {'follower', leader}
+"""
+
+# KEYS[1]: 结果缓存  KEYS[2]: 进行中锁  KEYS[3]: 等待者列表  KEYS[4]: LRU有序集合  KEYS[5]: 统计hash
+# KEYS[6]: 任务hash
+# ARGV[1]: 结果JSON（空字符串表示计算失败，不写缓存）  ARGV[2]: 缓存TTL（毫秒）  ARGV[3]: 当前时间（毫秒）
+# ARGV[4]: 内容摘要  ARGV[5]: 最大缓存条目数  ARGV[6]: 缓存key前缀
+# 返回等待该结果的任务ID列表
+PUBLISH_SCRIPT = COUNT_CALL_LUA + """
+if ARGV[1] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    redis.call('ZADD', KEYS[4], ARGV[3], ARGV[4])
+    -- 清理已过期条目，再按最近访问时间淘汰超出上限的条目
+    redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', tonumber(ARGV[3]) - tonumber(ARGV[2]))
+    local excess = redis.call('ZCARD', KEYS[4]) - tonumber(ARGV[5])
+    if excess > 0 then
+        local evicted = redis.call('ZPOPMIN', KEYS[4], excess)
+        for i = 1, #evicted, 2 do
+            redis.call('DEL', ARGV[6] .. evicted[i])
+        end
+        redis.call('HINCRBY', KEYS[5], 'evictions', excess)
+    end
+end
+local waiters = redis.call('LRANGE', KEYS[3], 0, -1)
+redis.call('DEL', KEYS[2], KEYS[3])
+return waiters
+"""
+
+
+class ResultCache:
+    """
+    以内容寻址的结果缓存
+
+    以输入图片内容、模型ID、模型变体和输出选项计算摘要，缓存已生成的MinIO结果。
+    相同输入正在计算时，后到的任务挂到进行中的计算上，由先到的任务完成后统一写入结果。
+    """
+
+    def __init__(self):
+        self.client = redis_client.client
+        self._acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+        self._publish_script = self.client.register_script(PUBLISH_SCRIPT)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.RESULT_CACHE_ENABLED
+
+    @staticmethod
+    def make_key(
+        image_data: bytes,
+        model_id: str,
+        variant: str = "",
+        options: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """计算输入内容与处理参数的摘要"""
+        digest = hashlib.sha256(image_data)
+        digest.update(
+            json.dumps(
+                {"model_id": model_id, "variant": variant, "options": options or {}},
+                sort_keys=True,
+            ).encode()
+        )
+        return digest.hexdigest()
+
+    @staticmethod
+    def _keys(cache_key: str, task_id: str) -> List[str]:
+        return [
+            f"{CACHE_KEY_PREFIX}{cache_key}",
+            f"{INFLIGHT_KEY_PREFIX}{cache_key}",
+            f"{WAITERS_KEY_PREFIX}{cache_key}",
+            LRU_KEY,
+            STATS_KEY,
+            f"task:{task_id}",
+        ]
+
+    def acquire(self, cache_key: str, task_id: str) -> Tuple[str, Any]:
+        """
+        查询缓存并尝试成为该输入的计算者
+
+        Returns:
+            ("hit", 缓存的结果) / ("leader", None) / ("follower", 负责计算的任务ID)
+        """
+        state, payload = self._acquire_script(
+            keys=self._keys(cache_key, task_id),
+            args=[
+                task_id,
+                settings.RESULT_CACHE_INFLIGHT_TTL * 1000,
+                int(time.time() * 1000),
+                cache_key,
+            ],
+        )
+        if state == "hit":
+            return state, json.loads(payload)
+        if state == "leader":
+            return state, None
+        return state, payload
+
+    def publish(
+        self, cache_key: str, task_id: str, result: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        写入计算结果并释放进行中锁
+
+        Args:
+            cache_key: 内容摘要
+            task_id: 负责计算的任务ID
+            result: 处理结果，为None时表示计算失败或被取消，不写入缓存
+
+        Returns:
+            等待该结果的任务ID列表
+        """
+        return self._publish_script(
+            keys=self._keys(cache_key, task_id),
+            args=[
+                json.dumps(result) if result else "",
+                settings.RESULT_CACHE_TTL * 1000,
+                int(time.time() * 1000),
+                cache_key,
+                settings.RESULT_CACHE_MAX_ENTRIES,
+                CACHE_KEY_PREFIX,
+            ],
+        )
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        pipe = async_redis_client.client.pipeline(transaction=False)
+        pipe.hgetall(STATS_KEY)
+        pipe.zcard(LRU_KEY)
+        stats, entries = await pipe.execute()
+
+        hits = int(stats.get("hits", 0))
+        misses = int(stats.get("misses", 0))
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "coalesced": int(stats.get("coalesced", 0)),
+            "evictions": int(stats.get("evictions", 0)),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache()
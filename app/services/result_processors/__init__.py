@@ -8,6 +8,9 @@ from .realesrgan import RealESRGANResultProcessor
 class ResultProcessorFactory:
     _processors: Dict[str, Type[BaseResultProcessor]] = {
         "segmentation": SegmentationResultProcessor,
+        "birefnet": SegmentationResultProcessor,
+        "birefnet-hr": SegmentationResultProcessor,
+        "birefnet-portrait": SegmentationResultProcessor,
         "ocr": OCRResultProcessor,
         "realesrgan": RealESRGANResultProcessor,
     }
@@ -1,6 +1,5 @@
 from .base import BaseResultProcessor
 from app.utils.minio_client import minio_client
-import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,15 +7,14 @@ logger = logging.getLogger(__name__)
 
 class RealESRGANResultProcessor(BaseResultProcessor):
     def process(self, result: dict, file_url: str, task_id: str) -> dict:
-        original_file = file_url.split("/")[-1]
-        name, ext = os.path.splitext(original_file)
-        result_file = f"{name}_upscaled{ext}"
-
-        logger.info(f"Saving upscaled image as {result_file}")
-        result_url = minio_client.upload_file(
-            result["result_image"], result_file, "image/png"
+        image = result["result_array"]
+        logger.info(
+            f"Streaming upscaled image {image.shape[1]}x{image.shape[0]} for task {task_id}"
         )
+        # 超分结果可能远超上传尺寸限制，按行带编码并分片上传，不做尺寸校验
+        result_url = minio_client.save_png_stream(image, task_id)
 
         return {
             "result_image_url": result_url,
+            "skipped_tile_ratio": result.get("skipped_tile_ratio", 0.0),
         }
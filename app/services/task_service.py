@@ -1,16 +1,23 @@
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from collections import defaultdict
 import base64
+from fastapi import BackgroundTasks
+from app.core.config import settings
 from app.utils.minio_client import minio_client
-from app.utils.redis_client import redis_client
+from app.utils.redis_client import redis_client, async_redis_client, TaskRejected
 from app.core.model_registry import model_registry
 from app.services.result_processors import ResultProcessorFactory
+from app.services.result_cache import result_cache
+from app.services.admission import admission_controller, AdmissionRejected
 import os
 from PIL import Image
 import io
 import logging
+import socket
 import threading
-from concurrent.futures import ThreadPoolExecutor, Future
+import time
+from concurrent.futures import Future
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -20,38 +27,155 @@ logger = logging.getLogger(__name__)
 class TaskService:
     def __init__(self):
         self.running_tasks = {}  # 存储正在运行的任务
-        self.executor = ThreadPoolExecutor(max_workers=4)  # 控制并发任务数
         self._lock = threading.Lock()  # 线程锁
+        self._leases: Dict[str, str] = {}  # 本进程持有的任务ID -> 认领时的消息ID
+        self._heartbeat: Optional[threading.Thread] = None
 
-    def create_task(self, task_id: str, file_url: str, model_id: str) -> Dict[str, Any]:
+    @property
+    def owner(self) -> str:
+        """本进程作为任务持有者及消费组成员的名称"""
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    def _ensure_heartbeat(self):
+        """启动续约线程（仅首次认领时）"""
+        with self._lock:
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._heartbeat = threading.Thread(
+                    target=self._renew_leases, name="task-lease", daemon=True
+                )
+                self._heartbeat.start()
+
+    def _renew_leases(self):
+        """定期为处理中的任务续约，长时间运行的任务不会被其他worker接管"""
+        while True:
+            time.sleep(settings.TASK_LEASE_RENEW_INTERVAL)
+            with self._lock:
+                leases = dict(self._leases)
+            if not leases:
+                continue
+            try:
+                for task_id in redis_client.renew_leases(self.owner, leases):
+                    logger.warning(f"Lost lease on task {task_id}, its result will be discarded")
+            except Exception as e:
+                logger.error(f"Failed to renew task leases: {str(e)}")
+
+    def _mark_completed(self, task_id: str, result: Dict) -> bool:
+        """以持有者身份标记本进程认领的任务完成"""
+        with self._lock:
+            message_id = self._leases.get(task_id, "")
+        return redis_client.mark_task_completed(
+            task_id, result, owner=self.owner, message_id=message_id
+        )
+
+    def _mark_failed(self, task_id: str, error: str) -> bool:
+        """以持有者身份标记本进程认领的任务失败"""
+        with self._lock:
+            message_id = self._leases.get(task_id, "")
+        return redis_client.mark_task_failed(
+            task_id, error, owner=self.owner, message_id=message_id
+        )
+
+    async def create_task(
+        self, task_id: str, file_url: str, model_id: str, variant: str = ""
+    ) -> Dict[str, Any]:
         """创建新任务"""
         try:
             # 检查模型是否存在
-            if model_id not in model_registry.models:
+            if not model_registry.has_model(model_id):
                 raise ValueError(f"Model {model_id} not found")
 
-            # 创建任务记录
-            task_data = redis_client.create_task(task_id, file_url, model_id)
+            # 创建任务记录；排队耗时超过上限时拒绝
+            (cost,) = await admission_controller.estimate_costs(
+                [file_url], model_id, variant
+            )
+            task_data = await async_redis_client.create_task(
+                task_id,
+                file_url,
+                model_id,
+                variant,
+                cost=cost,
+                max_queued_cost=admission_controller.max_queued_cost,
+            )
             logger.info(f"Created task: {task_id} for model: {model_id}")
 
             return task_data
 
+        except TaskRejected as e:
+            raise admission_controller.rejected(e)
         except Exception as e:
             logger.error(f"Failed to create task: {str(e)}")
             raise Exception(f"Failed to create task: {str(e)}")
 
-    def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+    async def create_tasks(
+        self, file_urls: List[str], model_id: str, variant: str = ""
+    ) -> List[Dict[str, Any]]:
+        """批量创建同一模型的任务，所有写入在一次Redis往返中完成"""
+        try:
+            # 检查模型是否存在
+            if not model_registry.has_model(model_id):
+                raise ValueError(f"Model {model_id} not found")
+
+            # 整批按总耗时一次性准入，不会只创建其中一部分
+            costs = await admission_controller.estimate_costs(file_urls, model_id, variant)
+            await admission_controller.check(model_id, sum(costs))
+
+            tasks = [
+                (str(uuid.uuid4()), file_url, model_id, variant, cost)
+                for file_url, cost in zip(file_urls, costs)
+            ]
+            created = await async_redis_client.create_tasks(tasks)
+            logger.info(f"Created {len(created)} tasks for model: {model_id}")
+
+            return created
+
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to create tasks: {str(e)}")
+            raise Exception(f"Failed to create tasks: {str(e)}")
+
+    async def get_tasks_status(
+        self, task_ids: List[str]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """批量获取任务状态"""
+        return await async_redis_client.get_tasks(task_ids)
+
+    async def list_tasks(
+        self,
+        status: Optional[str] = None,
+        model_id: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按状态和/或模型列出任务，按创建时间升序，返回任务列表及下一页游标"""
+        return await async_redis_client.list_tasks(status, model_id, since, limit, cursor)
+
+    async def get_task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务状态"""
-        return redis_client.get_task(task_id)
+        return await async_redis_client.get_task(task_id)
+
+    async def wait_for_task(
+        self, task_id: str, timeout: float
+    ) -> Optional[Dict[str, Any]]:
+        """等待任务结束后返回任务状态，超时返回最新状态"""
+        return await async_redis_client.wait_for_task(task_id, timeout)
+
+    def watch_task(self, task_id: str, timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        """订阅任务状态变更，直到任务结束或超时"""
+        return async_redis_client.watch_task(task_id, timeout)
 
     async def delete_task(self, task_id: str) -> bool:
         """删除任务并停止处理"""
         try:
             # 获取任务信息
-            task_data = redis_client.get_task(task_id)
+            task_data = await async_redis_client.get_task(task_id)
             if not task_data:
                 return False
 
+            # 原子地取消任务，正在处理该任务的worker将无法再写入结果
+            await async_redis_client.cancel_task(task_id)
+
             # 如果任务正在运行，停止它
             with self._lock:
                 if task_id in self.running_tasks:
@@ -63,7 +187,7 @@ class TaskService:
                     del self.running_tasks[task_id]
 
             # 从Redis中删除任务
-            redis_client.delete_task(task_id)
+            await async_redis_client.delete_task(task_id, task_data.get("model_id", ""))
             logger.info(f"Task {task_id} deleted successfully")
 
             return True
@@ -71,85 +195,264 @@ class TaskService:
             logger.error(f"Failed to delete task {task_id}: {str(e)}")
             return False
 
+    def claim_task(
+        self, task_id: str, message_id: str = "", reclaim: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """认领任务，已被其他worker认领或已结束的任务返回None"""
+        task_data = redis_client.claim_task(task_id, message_id, reclaim, self.owner)
+        if not task_data:
+            logger.info(f"Task {task_id} is missing or already claimed, skipping")
+            return None
+
+        # 处理期间由续约线程延长租约，任务结束时在 _release_task 中移除
+        with self._lock:
+            self._leases[task_id] = message_id
+        self._ensure_heartbeat()
+        logger.info(f"Task {task_id} marked as processing")
+        return task_data
+
+    def _start_task(self, task_data: Dict[str, Any]) -> Tuple[bytes, Future]:
+        """下载已认领任务的输入图片"""
+        task_id = task_data["task_id"]
+
+        # 下载图片
+        file_url = task_data["file_url"]
+        logger.info(f"Downloading image from {file_url}")
+        image_data = minio_client.get_file(file_url)
+
+        # 创建一个Future对象来跟踪任务
+        with self._lock:
+            future = Future()
+            self.running_tasks[task_id] = future
+
+        return image_data, future
+
+    def _finish_task(
+        self,
+        task_id: str,
+        task_data: Dict[str, Any],
+        result: Dict,
+        future: Future,
+        cache_key: Optional[str] = None,
+    ) -> bool:
+        """处理模型结果并标记任务完成，同时完成等待相同输入的任务"""
+        # 检查任务是否在处理过程中被取消
+        if future.cancelled():
+            logger.info(f"Task {task_id} was cancelled during processing")
+            self._mark_failed(task_id, "Task was cancelled")
+            self._release_cache(task_id, cache_key)
+            return False
+
+        # 获取对应的结果处理器
+        model_id = task_data["model_id"]
+        processor = ResultProcessorFactory.get_processor(model_id)
+        result_data = processor.process(result, task_data["file_url"], task_id)
+
+        # 再次检查任务是否被取消
+        if not future.cancelled():
+            # 更新任务状态
+            if self._mark_completed(task_id, result_data):
+                logger.info(f"Task {task_id} completed successfully")
+            else:
+                logger.warning(f"Task {task_id} was cancelled or taken over, result discarded")
+            future.set_result(result_data)
+        else:
+            logger.info(f"Task {task_id} was cancelled before completion")
+            self._mark_failed(task_id, "Task was cancelled")
+
+        # 结果写入缓存，并完成挂在该计算上的任务
+        if cache_key:
+            for waiter_id in result_cache.publish(cache_key, task_id, result_data):
+                logger.info(f"Task {waiter_id} completed from coalesced task {task_id}")
+                redis_client.mark_task_completed(waiter_id, result_data)
+
+        return not future.cancelled()
+
+    def _fail_task(
+        self,
+        task_id: str,
+        error: Exception,
+        future: Optional[Future],
+        cache_key: Optional[str] = None,
+    ):
+        """标记任务失败，等待相同输入的任务以同样的错误结束"""
+        logger.error(f"Task {task_id} failed with error: {str(error)}")
+        self._mark_failed(task_id, str(error))
+        if future and not future.done():
+            future.set_exception(error)
+
+        if cache_key:
+            for waiter_id in result_cache.publish(cache_key, task_id, None):
+                redis_client.mark_task_failed(waiter_id, str(error))
+
+    def _release_cache(self, task_id: str, cache_key: Optional[str]):
+        """
+        释放进行中锁但不写入结果；等待中的任务保持未确认状态，
+        超时后由worker重新认领并计算
+        """
+        if cache_key:
+            waiters = result_cache.publish(cache_key, task_id, None)
+            if waiters:
+                logger.info(f"Released {len(waiters)} coalesced tasks for retry")
+
+    def _release_task(self, task_id: str):
+        """从运行任务列表中移除，并停止为其续约"""
+        with self._lock:
+            if task_id in self.running_tasks:
+                del self.running_tasks[task_id]
+            self._leases.pop(task_id, None)
+
+    def _lookup_cache(
+        self, task_data: Dict[str, Any], image_data: bytes, future: Future
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        查询结果缓存
+
+        Returns:
+            (是否无需推理, 内容摘要)；命中缓存时直接完成任务，
+            相同输入正在计算时挂到该计算上，由计算者完成本任务
+        """
+        if not result_cache.enabled:
+            return False, None
+
+        task_id = task_data["task_id"]
+        # 以实际加载的变体计算摘要，未指定变体与显式指定默认变体共享缓存
+        model_id = task_data["model_id"]
+        variant = model_registry.resolve_variant(model_id, task_data.get("variant", ""))
+        cache_key = result_cache.make_key(image_data, model_id, variant)
+        state, payload = result_cache.acquire(cache_key, task_id)
+
+        if state == "hit":
+            logger.info(f"Task {task_id} completed from result cache")
+            self._mark_completed(task_id, payload)
+            future.set_result(payload)
+            return True, None
+
+        if state == "follower":
+            logger.info(f"Task {task_id} attached to in-flight task {payload}")
+            return True, None
+
+        return False, cache_key
+
+    def dispatch(self, background_tasks: BackgroundTasks, task_ids: List[str]):
+        """
+        按 TASK_DISPATCH_MODE 分派新建的任务
+
+        queue 模式下任务在创建时已写入队列，只由worker执行；
+        inline 模式下任务不入队，在当前API进程的后台任务中执行。
+        两种模式都通过原子认领保证每个任务只执行一次。
+        """
+        if settings.TASK_DISPATCH_MODE == "inline" and task_ids:
+            background_tasks.add_task(self.process_tasks, task_ids)
+
+    def process_tasks(self, task_ids: List[str]):
+        """认领并处理一组任务，同一模型同一变体的任务按 BATCH_MAX_SIZE 分批合并推理"""
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for task_id in task_ids:
+            task_data = self.claim_task(task_id)
+            if task_data:
+                groups[(task_data["model_id"], task_data.get("variant", ""))].append(
+                    task_data
+                )
+
+        for (model_id, variant), tasks in groups.items():
+            for start in range(0, len(tasks), settings.BATCH_MAX_SIZE):
+                self.process_batch(
+                    model_id, tasks[start : start + settings.BATCH_MAX_SIZE], variant
+                )
+
     def process_task(self, task_id: str):
         """处理任务"""
-        future = None
-        try:
-            logger.info(f"Starting to process task: {task_id}")
+        logger.info(f"Starting to process task: {task_id}")
+        task_data = self.claim_task(task_id)
+        if task_data:
+            self.process_batch(
+                task_data["model_id"], [task_data], task_data.get("variant", "")
+            )
 
-            # 获取任务信息
-            task_data = redis_client.get_task(task_id)
-            if not task_data:
-                logger.error(f"Task not found: {task_id}")
-                raise Exception("Task not found")
+    def process_batch(
+        self, model_id: str, tasks: List[Dict[str, Any]], variant: str = ""
+    ) -> Dict[str, bool]:
+        """
+        批量处理同一模型同一变体的已认领任务，一次前向推理后将结果分发回各任务
 
-            # 标记任务为处理中
-            redis_client.mark_task_processing(task_id)
-            logger.info(f"Task {task_id} marked as processing")
+        Args:
+            model_id: 模型ID
+            tasks: 通过 claim_task 认领的任务信息列表
+            variant: 模型变体，为空时使用模型的默认变体
 
-            # 获取模型实例
-            model_id = task_data["model_id"]
-            logger.info(f"Creating model instance for {model_id}")
-            model = model_registry.create_model_instance(model_id)
+        Returns:
+            任务ID到是否成功的映射
+        """
+        task_ids = [task_data["task_id"] for task_data in tasks]
+        outcomes = {task_id: False for task_id in task_ids}
+        started = []  # (task_id, task_data, decoded, future, cache_key)
+        decoder = None
 
-            # 下载图片
-            file_url = task_data["file_url"]
-            logger.info(f"Downloading image from {file_url}")
-            image_data = minio_client.get_file(file_url)
+        try:
+            # 逐个准备任务，单个任务失败不影响批次中的其他任务
+            for task_data in tasks:
+                task_id = task_data["task_id"]
+                future = None
+                cache_key = None
+                try:
+                    image_data, future = self._start_task(task_data)
+                    if future.cancelled():
+                        logger.info(f"Task {task_id} was cancelled before processing")
+                        self._mark_failed(task_id, "Task was cancelled")
+                        continue
 
-            # 创建一个Future对象来跟踪任务
-            with self._lock:
-                future = Future()
-                self.running_tasks[task_id] = future
+                    # 命中缓存或已有相同输入在计算时跳过推理
+                    done, cache_key = self._lookup_cache(task_data, image_data, future)
+                    if done:
+                        outcomes[task_id] = True
+                        continue
 
-            try:
-                # 检查任务是否已被取消
-                if future.cancelled():
-                    logger.info(f"Task {task_id} was cancelled before processing")
-                    redis_client.mark_task_failed(task_id, "Task was cancelled")
-                    return
-
-                # 执行模型推理
-                logger.info(f"Running model inference for task {task_id}")
-                result = model.predict(image_data)
-
-                # 检查任务是否在处理过程中被取消
-                if future.cancelled():
-                    logger.info(f"Task {task_id} was cancelled during processing")
-                    redis_client.mark_task_failed(task_id, "Task was cancelled")
-                    return
-
-                # 获取对应的结果处理器
-                processor = ResultProcessorFactory.get_processor(model_id)
-                result_data = processor.process(result, file_url, task_id)
-
-                # 再次检查任务是否被取消
-                if future and not future.cancelled():
-                    # 更新任务状态
-                    logger.info(f"Task {task_id} completed successfully")
-                    redis_client.mark_task_completed(task_id, result_data)
-                    future.set_result(result_data)
-                else:
-                    logger.info(f"Task {task_id} was cancelled before completion")
-                    redis_client.mark_task_failed(task_id, "Task was cancelled")
+                    # 推理前逐个解码，损坏的图片只导致该任务失败，不影响同批次的其他任务；
+                    # 解码不占用推理名额，实例可能随后被淘汰，推理时重新通过 acquire 获取
+                    if decoder is None:
+                        decoder = model_registry.create_model_instance(model_id, variant)
+                    decoded = decoder.decode(image_data)
+                    started.append((task_id, task_data, decoded, future, cache_key))
+                except Exception as e:
+                    self._fail_task(task_id, e, future, cache_key)
 
-            except Exception as e:
-                logger.error(f"Task {task_id} failed with error: {str(e)}")
-                redis_client.mark_task_failed(task_id, str(e))
-                if future and not future.cancelled():
-                    future.set_exception(e)
-                raise
-
-            finally:
-                # 从运行任务列表中移除
-                with self._lock:
-                    if task_id in self.running_tasks:
-                        del self.running_tasks[task_id]
+            if not started:
+                return outcomes
 
-        except Exception as e:
-            logger.error(f"Task {task_id} failed with error: {str(e)}")
-            redis_client.mark_task_failed(task_id, str(e))
-            raise
+            # 按模型划分的子批次依次推理，每个子批次的结果上传后才开始下一个
+            for indices in decoder.split_batch([item[2] for item in started]):
+                chunk = [started[i] for i in indices]
+                try:
+                    # 占用模型的推理名额，超出模型声明的最大并发数时等待
+                    with model_registry.acquire(model_id, variant) as model:
+                        logger.info(
+                            f"Running batched inference for {len(chunk)} tasks on {model_id}"
+                        )
+                        results = model.predict_decoded([item[2] for item in chunk])
+                except Exception as e:
+                    for task_id, _, _, future, cache_key in chunk:
+                        self._fail_task(task_id, e, future, cache_key)
+                    continue
+
+                # 分发结果到各任务的后处理与上传；上传后立即释放，
+                # 超分输出等大数组不会在整个批次中同时驻留内存
+                results.reverse()
+                for task_id, task_data, _, future, cache_key in chunk:
+                    result = results.pop()
+                    try:
+                        outcomes[task_id] = self._finish_task(
+                            task_id, task_data, result, future, cache_key
+                        )
+                    except Exception as e:
+                        self._fail_task(task_id, e, future, cache_key)
+                    del result
+
+            return outcomes
+
+        finally:
+            for task_id in task_ids:
+                self._release_task(task_id)
 
 
 task_service = TaskService()
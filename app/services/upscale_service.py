@@ -1,7 +1,4 @@
-import torch
-from PIL import Image
 from typing import Dict, Any
-import os
 from pathlib import Path
 import uuid
 import sys
@@ -11,8 +8,8 @@ project_root = str(Path(__file__).parent.parent.parent)
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from app.core.model_registry import model_registry
 from app.services.task_service import task_service
+from app.services.admission import AdmissionRejected
 
 
 class UpscaleService:
@@ -23,8 +20,7 @@ class UpscaleService:
     }
 
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        # 注册所有模型
+        # 注册所有模型（只登记导入路径，不导入模型代码）
         from app.models import __init__  # 确保模型已注册
 
     async def create_upscale_task(
@@ -41,20 +37,18 @@ class UpscaleService:
             task_id = str(uuid.uuid4())
 
             # 创建任务记录
-            task = task_service.create_task(task_id, file_url, model_id)
-
-            # 创建模型实例
-            model = model_registry.create_model_instance(model_id)
-            if not model:
-                raise ValueError(f"模型创建失败: {model_id}")
-
-            # 设置模型类型
-            model.model_type = model_type
+            task = await task_service.create_task(
+                task_id, file_url, model_id, variant=model_type
+            )
 
             return task
+        except AdmissionRejected:
+            raise
         except Exception as e:
             raise Exception(f"Failed to create task: {str(e)}")
 
-    async def get_task_status(self, task_id: str) -> Dict[str, Any]:
-        """获取任务状态"""
-        return task_service.get_task_status(task_id)
+    async def get_task_status(self, task_id: str, wait: int = 0) -> Dict[str, Any]:
+        """获取任务状态，wait大于0时等待任务结束后返回"""
+        if wait > 0:
+            return await task_service.wait_for_task(task_id, wait)
+        return await task_service.get_task_status(task_id)
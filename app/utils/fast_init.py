@@ -0,0 +1,95 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Dict, Iterator, List, Tuple
+import torch
+
+logger = logging.getLogger(__name__)
+
+# torch.nn.init 中会写入张量的初始化函数
+TORCH_INIT_FUNCTIONS = (
+    "uniform_",
+    "normal_",
+    "trunc_normal_",
+    "constant_",
+    "ones_",
+    "zeros_",
+    "eye_",
+    "dirac_",
+    "xavier_uniform_",
+    "xavier_normal_",
+    "kaiming_uniform_",
+    "kaiming_normal_",
+    "orthogonal_",
+    "sparse_",
+)
+
+
+def _skip_init(tensor: torch.Tensor, *args, **kwargs) -> torch.Tensor:
+    return tensor
+
+
+# 多个模型可能在不同线程中同时加载：替换是进程级的，按引用计数管理，
+# 最后一个退出的调用方才恢复原函数，避免把 _skip_init 当作原函数恢复
+_patch_lock = threading.Lock()
+_originals: Dict[Tuple[ModuleType, str], object] = {}
+_refcounts: Dict[Tuple[ModuleType, str], int] = {}
+
+
+@contextmanager
+def no_init_weights(extra_targets: Tuple[Tuple[ModuleType, str], ...] = ()):
+    """
+    构造模型时跳过随机初始化，参数保持未初始化的内存，随后由checkpoint覆盖
+
+    除 torch.nn.init 外，通过 `from ... import trunc_normal_` 绑定到模块命名空间的
+    初始化函数不会随之失效，需要以 (模块, 属性名) 的形式在 extra_targets 中列出。
+    仅用于紧接着会以 strict=True 加载完整权重的场景。
+    替换对整个进程生效，期间其他线程构造的模块同样不会初始化。
+    """
+    targets = [(torch.nn.init, name) for name in TORCH_INIT_FUNCTIONS]
+    targets.extend(extra_targets)
+
+    patched: List[Tuple[ModuleType, str]] = []
+    with _patch_lock:
+        for key in targets:
+            module, name = key
+            if key in patched or not hasattr(module, name):
+                continue
+            if _refcounts.get(key, 0) == 0:
+                _originals[key] = getattr(module, name)
+                setattr(module, name, _skip_init)
+            _refcounts[key] = _refcounts.get(key, 0) + 1
+            patched.append(key)
+
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            for key in reversed(patched):
+                _refcounts[key] -= 1
+                if _refcounts[key] == 0:
+                    module, name = key
+                    setattr(module, name, _originals.pop(key))
+                    del _refcounts[key]
+
+
+class LoadTimer:
+    """记录模型加载各阶段（构造/加载权重/移动到设备）的耗时"""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+
+    def log(self, label: str):
+        total = sum(self.timings.values())
+        stages = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.timings.items())
+        logger.info(f"Loaded {label} in {total:.3f}s ({stages})")
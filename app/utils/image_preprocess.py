@@ -0,0 +1,118 @@
+import io
+import threading
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import torch
+from PIL import Image
+
+# ImageNet 归一化参数
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def _nbytes(tensor: torch.Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+class ImagePreprocessor:
+    """
+    可复用的图像预处理引擎：解码 -> 缩放到 size x size -> 归一化的 [B,3,size,size] 张量
+
+    - JPEG 使用 draft() 在DCT阶段按 1/2、1/4、1/8 缩小解码，得到不小于目标尺寸的最小图像，
+      避免全分辨率解码大图
+    - uint8 像素直接拷贝进float缓冲区，再原地乘加完成归一化，
+      等价于 ToTensor + Normalize 但不产生中间张量
+    - 每个线程复用预分配的输入缓冲区，返回的张量在同一线程下次调用前有效；
+      缓存的缓冲区总量不超过 max_cached_bytes，超出时临时分配、用完即释放
+    """
+
+    def __init__(
+        self,
+        size: int,
+        mean: Sequence[float] = IMAGENET_MEAN,
+        std: Sequence[float] = IMAGENET_STD,
+        max_cached_bytes: int = 0,
+    ):
+        self.size = size
+        self.max_cached_bytes = max_cached_bytes
+        mean_t = torch.tensor(mean, dtype=torch.float32).view(3, 1, 1)
+        std_t = torch.tensor(std, dtype=torch.float32).view(3, 1, 1)
+        # (x / 255 - mean) / std == x * scale + bias
+        self._scale = 1.0 / (255.0 * std_t)
+        self._bias = -mean_t / std_t
+        # 线程ID -> 该线程缓存的输入缓冲区；以字典保存以便统计占用和整体释放
+        self._buffers: Dict[int, torch.Tensor] = {}
+        self._lock = threading.Lock()
+
+    def decode(self, input_data: bytes) -> Tuple[Image.Image, Tuple[int, int]]:
+        """
+        解码并缩放图像
+
+        Returns:
+            (size x size 的RGB图像, 原始尺寸)
+        """
+        image = Image.open(io.BytesIO(input_data))
+        original_size = image.size
+
+        if image.format == "JPEG":
+            # draft 只会选择不小于请求尺寸的缩放比例
+            image.draft("RGB", (self.size, self.size))
+
+        image = image.convert("RGB")
+        if image.size != (self.size, self.size):
+            image = image.resize((self.size, self.size), Image.BILINEAR)
+        return image, original_size
+
+    def _buffer(self, batch_size: int) -> torch.Tensor:
+        """获取当前线程的输入缓冲区，容量不足时重新分配"""
+        thread_id = threading.get_ident()
+        buffer = self._buffers.get(thread_id)
+        if buffer is not None and buffer.shape[0] >= batch_size:
+            return buffer[:batch_size]
+
+        buffer = torch.empty((batch_size, 3, self.size, self.size), dtype=torch.float32)
+        with self._lock:
+            # 当前线程旧的缓冲区容量不足，先从缓存中移除
+            self._buffers.pop(thread_id, None)
+            if self.memory_bytes() + _nbytes(buffer) <= self.max_cached_bytes:
+                self._buffers[thread_id] = buffer
+        return buffer
+
+    def memory_bytes(self) -> int:
+        """缓存的输入缓冲区占用的内存"""
+        return sum(_nbytes(buffer) for buffer in list(self._buffers.values()))
+
+    def release(self):
+        """释放所有线程缓存的输入缓冲区"""
+        with self._lock:
+            self._buffers.clear()
+
+    def prepare(
+        self, inputs: List[bytes]
+    ) -> Tuple[torch.Tensor, List[Tuple[int, int]]]:
+        """
+        将一批编码图片转换为归一化的输入张量
+
+        Returns:
+            ([B,3,size,size] 输入张量, 各图片的原始尺寸)
+        """
+        return self.stack([self.decode(input_data) for input_data in inputs])
+
+    def stack(
+        self, decoded: List[Tuple[Image.Image, Tuple[int, int]]]
+    ) -> Tuple[torch.Tensor, List[Tuple[int, int]]]:
+        """
+        将 decode 得到的图像写入输入缓冲区并归一化
+
+        Returns:
+            ([B,3,size,size] 输入张量, 各图片的原始尺寸)
+        """
+        batch = self._buffer(len(decoded))
+        original_sizes = []
+        for i, (image, original_size) in enumerate(decoded):
+            original_sizes.append(original_size)
+
+            pixels = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+            batch[i].copy_(pixels).mul_(self._scale).add_(self._bias)
+
+        return batch, original_sizes
@@ -3,9 +3,16 @@ from minio.error import S3Error
 from app.core.config import settings
 import uuid
 import os
-from typing import Optional, Tuple
+from typing import Any, Callable, Optional, Tuple
 import io
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlparse
 from PIL import Image
+import numpy as np
+from app.utils.png_stream import encode_png_stream, IterStream
 
 
 class MinioClient:
@@ -13,6 +20,7 @@ class MinioClient:
     FILE_TYPE_ORIGINAL = "original"  # 原始文件
     FILE_TYPE_OUTPUT = "output"  # 处理结果
     FILE_TYPE_MASK = "masks"  # 遮罩文件
+    FILE_TYPE_ARCHIVE = "archive"  # 归档文件
 
     # 支持的图片类型
     SUPPORTED_IMAGE_TYPES = {
@@ -28,19 +36,30 @@ class MinioClient:
     MAX_IMAGE_DIMENSION = 3600  # 最大图片尺寸
 
     def __init__(self):
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
-            access_key=settings.MINIO_ACCESS_KEY,
-            secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE,
-        )
         self.bucket = settings.MINIO_BUCKET
-        self._ensure_bucket_exists()
-
-    def _ensure_bucket_exists(self):
+        self._client: Optional[Minio] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Minio:
+        """首次使用时才创建客户端并检查存储桶，导入模块时不访问网络"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    client = Minio(
+                        settings.MINIO_ENDPOINT,
+                        access_key=settings.MINIO_ACCESS_KEY,
+                        secret_key=settings.MINIO_SECRET_KEY,
+                        secure=settings.MINIO_SECURE,
+                    )
+                    self._ensure_bucket_exists(client)
+                    self._client = client
+        return self._client
+
+    def _ensure_bucket_exists(self, client: Minio):
         """确保存储桶存在"""
-        if not self.client.bucket_exists(self.bucket):
-            self.client.make_bucket(self.bucket)
+        if not client.bucket_exists(self.bucket):
+            client.make_bucket(self.bucket)
 
     def _validate_file_size(self, file_size: int) -> bool:
         """
@@ -58,13 +77,16 @@ class MinioClient:
             )
         return True
 
-    def _validate_image_dimensions(self, image_data: bytes) -> bool:
+    def _validate_image_dimensions(self, image_data: bytes) -> Tuple[int, int]:
         """
         验证图片尺寸是否在限制范围内
 
         Args:
             image_data: 图片数据
 
+        Returns:
+            图片的 (宽, 高)
+
         Raises:
             ValueError: 当图片尺寸超过限制时抛出
         """
@@ -81,7 +103,7 @@ class MinioClient:
                     f"图片尺寸超过限制: {width}x{height}，最大支持{self.MAX_IMAGE_DIMENSION}x{self.MAX_IMAGE_DIMENSION}"
                 )
 
-            return True
+            return width, height
         except Exception as e:
             raise ValueError(f"无法验证图片尺寸: {str(e)}")
 
@@ -119,8 +141,15 @@ class MinioClient:
         # 获取最后一个路径部分作为文件名
         return os.path.basename(url)
 
-    def upload_file(self, file_data: bytes, file_url: str, content_type: str) -> str:
-        """上传原始文件到MinIO的original目录"""
+    def upload_file(
+        self, file_data: bytes, file_url: str, content_type: str
+    ) -> Tuple[str, Tuple[int, int]]:
+        """
+        上传原始文件到MinIO的original目录
+
+        Returns:
+            (文件URL, 图片的 (宽, 高))
+        """
         try:
             # 从URL中获取原始文件名
             original_name = self._get_file_name_from_url(file_url)
@@ -132,7 +161,7 @@ class MinioClient:
             self._validate_image_type(content_type, original_name)
 
             # 验证图片尺寸
-            self._validate_image_dimensions(file_data)
+            size = self._validate_image_dimensions(file_data)
 
             # 生成唯一文件名
             ext = os.path.splitext(original_name)[1]
@@ -151,24 +180,32 @@ class MinioClient:
             )
 
             # 返回文件URL
-            return self.client.presigned_get_object(self.bucket, unique_name)
+            return self.client.presigned_get_object(self.bucket, unique_name), size
         except S3Error as e:
             raise Exception(f"Failed to upload file: {str(e)}")
 
+    def object_name(self, file_name: str) -> str:
+        """将文件URL或路径转换为存储桶中的对象名"""
+        # 预签名URL只取对象路径部分
+        if file_name.startswith(("http://", "https://")):
+            file_name = urlparse(file_name).path
+
+        # 处理文件路径，移除重复的bucket前缀
+        if file_name.startswith(self.bucket + "/"):
+            file_name = file_name[len(self.bucket) + 1 :]
+        elif file_name.startswith("/" + self.bucket + "/"):
+            file_name = file_name[len("/" + self.bucket) + 1 :]
+
+        # 移除开头的斜杠
+        if file_name.startswith("/"):
+            file_name = file_name[1:]
+
+        return file_name
+
     def get_file(self, file_name: str) -> bytes:
         """从MinIO获取文件"""
         try:
-            # 处理文件路径，移除重复的bucket前缀
-            if file_name.startswith(self.bucket + "/"):
-                file_name = file_name[len(self.bucket) + 1 :]
-            elif file_name.startswith("/" + self.bucket + "/"):
-                file_name = file_name[len("/" + self.bucket) + 1 :]
-
-            # 移除开头的斜杠
-            if file_name.startswith("/"):
-                file_name = file_name[1:]
-
-            return self.client.get_object(self.bucket, file_name).read()
+            return self.client.get_object(self.bucket, self.object_name(file_name)).read()
         except S3Error as e:
             raise Exception(f"Failed to get file: {str(e)}")
 
@@ -180,14 +217,22 @@ class MinioClient:
             # 保存分割结果到 output 目录
             result_name = f"{self.FILE_TYPE_OUTPUT}/{task_id}_result.png"
             self.client.put_object(
-                self.bucket, result_name, image_data, len(image_data), "image/png"
+                self.bucket,
+                result_name,
+                io.BytesIO(image_data),
+                len(image_data),
+                "image/png",
             )
             result_url = self.client.presigned_get_object(self.bucket, result_name)
 
             # 保存遮罩到 masks 目录
             mask_name = f"{self.FILE_TYPE_MASK}/{task_id}_mask.png"
             self.client.put_object(
-                self.bucket, mask_name, mask_data, len(mask_data), "image/png"
+                self.bucket,
+                mask_name,
+                io.BytesIO(mask_data),
+                len(mask_data),
+                "image/png",
             )
             mask_url = self.client.presigned_get_object(self.bucket, mask_name)
 
@@ -195,5 +240,83 @@ class MinioClient:
         except S3Error as e:
             raise Exception(f"Failed to save results: {str(e)}")
 
+    def save_png_stream(self, image: np.ndarray, task_id: str) -> str:
+        """
+        将 uint8 RGB 图像按行带编码为PNG，并以分片上传流式写入 output 目录
+
+        编码结果不会完整地保存在内存中，同一时间只缓冲一个上传分片
+        """
+        try:
+            object_name = f"{self.FILE_TYPE_OUTPUT}/{task_id}_upscaled.png"
+            stream = IterStream(
+                encode_png_stream(
+                    image,
+                    band_rows=settings.RESULT_PNG_BAND_ROWS,
+                    compress_level=settings.RESULT_PNG_COMPRESS_LEVEL,
+                )
+            )
+            self.client.put_object(
+                self.bucket,
+                object_name,
+                stream,
+                length=-1,
+                content_type="image/png",
+                part_size=settings.MINIO_PART_SIZE_MB * 1024 * 1024,
+            )
+            return self.client.presigned_get_object(self.bucket, object_name)
+        except S3Error as e:
+            raise Exception(f"Failed to save result: {str(e)}")
+
+    def save_archive(self, data: bytes, name: str) -> str:
+        """保存归档文件到 archive 目录，返回对象名称"""
+        try:
+            object_name = f"{self.FILE_TYPE_ARCHIVE}/{name}"
+            self.client.put_object(
+                self.bucket,
+                object_name,
+                io.BytesIO(data),
+                len(data),
+                "application/gzip",
+            )
+            return object_name
+        except S3Error as e:
+            raise Exception(f"Failed to save archive: {str(e)}")
+
+
+class AsyncMinioClient:
+    """
+    MinIO客户端的异步封装
+
+    MinIO SDK为同步实现，调用在有界线程池中执行，避免阻塞API事件循环，
+    同时限制并发的S3请求数
+    """
+
+    def __init__(self, client: MinioClient):
+        self.client = client
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.MINIO_MAX_WORKERS, thread_name_prefix="minio"
+        )
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
+
+    async def upload_file(
+        self, file_data: bytes, file_url: str, content_type: str
+    ) -> Tuple[str, Tuple[int, int]]:
+        """上传原始文件到MinIO的original目录，返回文件URL及图片宽高"""
+        return await self._run(self.client.upload_file, file_data, file_url, content_type)
+
+    async def get_file(self, file_name: str) -> bytes:
+        """从MinIO获取文件"""
+        return await self._run(self.client.get_file, file_name)
+
+    async def save_result(
+        self, image_data: bytes, mask_data: bytes, task_id: str
+    ) -> Tuple[str, str]:
+        """保存分割结果和遮罩到指定目录"""
+        return await self._run(self.client.save_result, image_data, mask_data, task_id)
+
 
 minio_client = MinioClient()
+async_minio_client = AsyncMinioClient(minio_client)
@@ -0,0 +1,107 @@
+import io
+import struct
+import zlib
+from typing import Iterator, Optional
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG 行过滤类型：Up（与上一行逐字节相减）
+FILTER_UP = 2
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """构造一个PNG数据块：长度 + 类型 + 数据 + CRC"""
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+    )
+
+
+def encode_png_stream(
+    image: np.ndarray, band_rows: int = 256, compress_level: int = 6
+) -> Iterator[bytes]:
+    """
+    按行带流式编码PNG，逐块产出编码后的字节
+
+    每次只对 band_rows 行做 Up 过滤和 zlib 压缩，内存中只保留一个行带，
+    不会生成完整的编码结果
+
+    Args:
+        image: [H, W, 3] 的 uint8 RGB 图像
+        band_rows: 每个行带的行数
+        compress_level: zlib 压缩等级（0-9）
+    """
+    if image.dtype != np.uint8 or image.ndim != 3 or image.shape[2] != 3:
+        raise ValueError(f"Expected an HxWx3 uint8 image, got {image.dtype} {image.shape}")
+
+    height, width, _ = image.shape
+    yield PNG_SIGNATURE
+    # 8位真彩色，无隔行
+    yield _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    compressor = zlib.compressobj(compress_level)
+    row_bytes = width * 3
+    previous = np.zeros(row_bytes, dtype=np.uint8)
+    for top in range(0, height, band_rows):
+        band = image[top : top + band_rows].reshape(-1, row_bytes)
+
+        # 每行前加过滤类型字节，数据为当前行减上一行（uint8 自然回绕）
+        filtered = np.empty((band.shape[0], row_bytes + 1), dtype=np.uint8)
+        filtered[:, 0] = FILTER_UP
+        np.subtract(band[1:], band[:-1], out=filtered[1:, 1:])
+        np.subtract(band[0], previous, out=filtered[0, 1:])
+        previous = band[-1].copy()
+
+        data = compressor.compress(filtered.data)
+        if data:
+            yield _chunk(b"IDAT", data)
+
+    data = compressor.flush()
+    if data:
+        yield _chunk(b"IDAT", data)
+    yield _chunk(b"IEND", b"")
+
+
+class IterStream(io.RawIOBase):
+    """将字节块迭代器包装为只读文件对象，供按需 read 的上传接口使用"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+
+        # 尽量凑满请求的字节数，减少上传端的循环次数
+        parts = []
+        remaining = size
+        while remaining > 0:
+            if not self._buffer:
+                try:
+                    self._buffer = next(self._chunks)
+                except StopIteration:
+                    break
+            part = self._buffer[:remaining]
+            self._buffer = self._buffer[len(part) :]
+            parts.append(part)
+            remaining -= len(part)
+        return b"".join(parts)
@@ -1,12 +1,429 @@
 import redis
+import redis.asyncio as aioredis
+import asyncio
 import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime, UTC
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple, AsyncIterator
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 任务索引key前缀：按状态/模型维护以创建时间为分数的有序集合
+TASK_INDEX_PREFIX = "tasks:"
+# 出现过的模型ID集合，用于遍历模型索引
+TASK_MODELS_SET = "tasks:models"
+# 各模型未完成任务（待处理+处理中）的预估推理耗时之和，用于准入控制
+TASK_COST_KEY = "tasks:queued_cost"
+# 上传文件的元信息（宽高），key为对象名
+FILE_META_PREFIX = "file_meta:"
+
+# 已结束的任务状态
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+TASK_STATUSES = ("pending", "processing") + TERMINAL_STATUSES
+
+
+def task_channel(task_id: str) -> str:
+    """任务状态变更的发布频道"""
+    return f"{settings.TASK_EVENTS_CHANNEL_PREFIX}{task_id}"
+
+
+def status_index(status: str) -> str:
+    """按状态的任务索引"""
+    return f"{TASK_INDEX_PREFIX}status:{status}"
+
+
+def model_index(model_id: str) -> str:
+    """按模型的任务索引"""
+    return f"{TASK_INDEX_PREFIX}model:{model_id}"
+
+
+def task_ttl(status: str) -> int:
+    """已结束任务的保留时间（秒），0表示不过期"""
+    return {
+        "completed": settings.TASK_TTL_COMPLETED,
+        "failed": settings.TASK_TTL_FAILED,
+        "cancelled": settings.TASK_TTL_CANCELLED,
+    }.get(status, 0)
+
+
+# 以下Lua脚本在服务端原子地完成"检查并设置"，每次状态变更只需一次往返。
+# 每个脚本都会对任务hash中的 redis_calls 计数加一，用于统计单个任务的Redis往返次数
+# （续约、读取任务和结果缓存脚本同样计数），
+# 状态变更成功后在任务频道上发布 {"task_id", "status"} 事件。
+# 状态变更时同步移动任务在状态索引中的位置；任务结束时按最终状态设置过期时间。
+# 任务创建时将预估耗时计入模型的排队耗时，结束、取消或删除未完成任务时扣除。
+
+# 扣除任务的排队耗时，供结束/取消/删除脚本在状态变更时调用
+RELEASE_COST_LUA = """
+local function release_cost(task_key, cost_key)
+    local fields = redis.call('HMGET', task_key, 'model_id', 'cost')
+    local cost = tonumber(fields[2] or '0') or 0
+    if fields[1] and cost > 0 then
+        local left = tonumber(redis.call('HINCRBYFLOAT', cost_key, fields[1], tostring(-cost)))
+        if left < 0.000001 then
+            redis.call('HDEL', cost_key, fields[1])
+        end
+    end
+end
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: 任务队列stream  KEYS[3]: pending索引  KEYS[4]: 模型索引  KEYS[5]: 模型集合
+# KEYS[6]: 排队耗时hash
+# ARGV[1]: 队列最大长度  ARGV[2]: 任务ID  ARGV[3]: 创建时间戳  ARGV[4]: 模型ID  ARGV[5]: 是否写入任务队列
+# ARGV[6]: 任务预估耗时  ARGV[7]: 模型排队耗时上限（0表示不限制）  ARGV[8...]: 任务字段与值
+# inline 分派模式下任务不写入队列，只由创建它的API进程执行；
+# 排队耗时超过上限时不创建任务，返回 {'rejected', 超出的耗时}
+CREATE_TASK_SCRIPT = """
+local cost = tonumber(ARGV[6])
+if cost > 0 then
+    local queued = tonumber(redis.call('HGET', KEYS[6], ARGV[4]) or '0')
+    local limit = tonumber(ARGV[7])
+    -- 队列为空时总是接受，否则超过上限的单个大任务永远无法提交
+    if limit > 0 and queued > 0 and queued + cost > limit then
+        return {'rejected', tostring(queued + cost - limit)}
+    end
+    redis.call('HINCRBYFLOAT', KEYS[6], ARGV[4], ARGV[6])
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 8))
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[2])
+redis.call('ZADD', KEYS[4], ARGV[3], ARGV[2])
+redis.call('SADD', KEYS[5], ARGV[4])
+if ARGV[5] == '1' then
+    return redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[1], '*', 'task_id', ARGV[2])
+end
+return false
+"""
+
+# 以Redis服务器时间计算租约，避免各worker之间的时钟偏差
+NOW_MS_LUA = """
+local function now_ms()
+    local time = redis.call('TIME')
+    return tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+end
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: pending索引  KEYS[3]: processing索引  KEYS[4]: 任务队列stream
+# ARGV[1]: 任务ID  ARGV[2]: 消息ID  ARGV[3]: 消费组  ARGV[4]: 开始时间  ARGV[5]: 是否允许接管处理中的任务
+# ARGV[6]: 事件频道  ARGV[7]: 持有者（消费者名称）  ARGV[8]: 租约时长（毫秒）
+# 认领成功返回任务hash并记录持有者与租约到期时间；处理中的任务只有租约过期后才能被接管。
+# 租约未过期时不确认消息，持有者续约时会将消息取回；其他不可认领的情况确认消息并返回nil
+CLAIM_TASK_SCRIPT = NOW_MS_LUA + """
+local fields = redis.call('HMGET', KEYS[1], 'status', 'lease_until')
+local status = fields[1]
+local now = now_ms()
+local reclaim = status == 'processing' and ARGV[5] == '1'
+if status == 'pending' or (reclaim and (tonumber(fields[2] or '0') or 0) < now) then
+    redis.call(
+        'HSET', KEYS[1], 'status', 'processing', 'started_at', ARGV[4], 'message_id', ARGV[2],
+        'owner', ARGV[7], 'lease_until', string.format('%.0f', now + tonumber(ARGV[8]))
+    )
+    redis.call('HINCRBY', KEYS[1], 'redis_calls', 1)
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[1], 'created_ts') or 0, ARGV[1])
+    redis.call('PUBLISH', ARGV[6], cjson.encode({task_id = ARGV[1], status = 'processing'}))
+    return redis.call('HGETALL', KEYS[1])
+end
+if reclaim then
+    return false
+end
+if ARGV[2] ~= '' then
+    redis.call('XACK', KEYS[4], ARGV[3], ARGV[2])
+end
+return false
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: 任务队列stream
+# ARGV[1]: 持有者（消费者名称）  ARGV[2]: 消息ID  ARGV[3]: 消费组  ARGV[4]: 租约时长（毫秒）
+# 任务仍由该持有者处理时延长租约，并以 XCLAIM 取回消息、重置空闲时间，避免被 XAUTOCLAIM 接管；
+# 返回1表示续约成功，0表示任务已结束或已被接管
+RENEW_LEASE_SCRIPT = NOW_MS_LUA + """
+local fields = redis.call('HMGET', KEYS[1], 'status', 'owner', 'message_id')
+if fields[1] ~= 'processing' or fields[2] ~= ARGV[1] or (fields[3] or '') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'lease_until', string.format('%.0f', now_ms() + tonumber(ARGV[4])))
+redis.call('HINCRBY', KEYS[1], 'redis_calls', 1)
+if ARGV[2] ~= '' then
+    redis.call('XCLAIM', KEYS[2], ARGV[3], ARGV[1], 0, ARGV[2], 'JUSTID')
+end
+return 1
+"""
+
+# KEYS[1]: 任务hash
+# 读取任务并计入一次Redis往返，任务不存在时返回空列表（不创建任务hash）
+GET_TASK_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return {}
+end
+redis.call('HINCRBY', KEYS[1], 'redis_calls', 1)
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: processing索引  KEYS[3]: 最终状态索引  KEYS[4]: 任务队列stream
+# KEYS[5]: 排队耗时hash
+# ARGV[1]: 任务ID  ARGV[2]: 最终状态  ARGV[3]: 完成时间  ARGV[4]: 错误信息  ARGV[5]: 结果JSON  ARGV[6]: 消费组
+# ARGV[7]: 事件频道  ARGV[8]: 保留时间（秒）  ARGV[9]: 认领时的消息ID  ARGV[10]: 持有者（为空时不检查）
+# 只有处理中的任务才能结束；任务已被其他worker接管（持有者或消息ID不一致）时不写入结果，
+# 消息留给新的持有者确认，其他情况都会确认对应的队列消息
+FINISH_TASK_SCRIPT = RELEASE_COST_LUA + """
+local fields = redis.call('HMGET', KEYS[1], 'status', 'message_id', 'owner')
+if ARGV[10] ~= '' and fields[1] == 'processing'
+    and (fields[3] ~= ARGV[10] or (fields[2] or '') ~= ARGV[9]) then
+    return 0
+end
+local message_id = fields[2]
+if ARGV[10] ~= '' then
+    message_id = ARGV[9]
+end
+if message_id and message_id ~= '' then
+    redis.call('XACK', KEYS[4], ARGV[6], message_id)
+end
+if fields[1] ~= 'processing' then
+    return 0
+end
+release_cost(KEYS[1], KEYS[5])
+redis.call('HSET', KEYS[1], 'status', ARGV[2], 'completed_at', ARGV[3], 'error', ARGV[4])
+if ARGV[5] ~= '' then
+    redis.call('HSET', KEYS[1], 'result', ARGV[5])
+end
+redis.call('HINCRBY', KEYS[1], 'redis_calls', 1)
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[1], 'created_ts') or 0, ARGV[1])
+if tonumber(ARGV[8]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[8])
+end
+redis.call('PUBLISH', ARGV[7], cjson.encode({task_id = ARGV[1], status = ARGV[2]}))
+return 1
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: pending索引  KEYS[3]: processing索引  KEYS[4]: cancelled索引
+# KEYS[5]: 排队耗时hash
+# ARGV[1]: 任务ID  ARGV[2]: 取消时间  ARGV[3]: 事件频道  ARGV[4]: 保留时间（秒）
+CANCEL_TASK_SCRIPT = RELEASE_COST_LUA + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status ~= 'pending' and status ~= 'processing' then
+    return 0
+end
+release_cost(KEYS[1], KEYS[5])
+redis.call('HSET', KEYS[1], 'status', 'cancelled', 'completed_at', ARGV[2], 'error', 'Task was cancelled')
+redis.call('HINCRBY', KEYS[1], 'redis_calls', 1)
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('ZADD', KEYS[4], redis.call('HGET', KEYS[1], 'created_ts') or 0, ARGV[1])
+if tonumber(ARGV[4]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+redis.call('PUBLISH', ARGV[3], cjson.encode({task_id = ARGV[1], status = 'cancelled'}))
+return 1
+"""
+
+# KEYS[1]: 任务hash  KEYS[2]: 排队耗时hash  KEYS[3...]: 各状态索引及模型索引
+# ARGV[1]: 任务ID
+# 删除任务hash并从状态索引和模型索引中移除，未完成的任务同时扣除排队耗时
+DELETE_TASK_SCRIPT = RELEASE_COST_LUA + """
+local status = redis.call('HGET', KEYS[1], 'status')
+if status == 'pending' or status == 'processing' then
+    release_cost(KEYS[1], KEYS[2])
+end
+for i = 3, #KEYS do
+    redis.call('ZREM', KEYS[i], ARGV[1])
+end
+return redis.call('DEL', KEYS[1])
+"""
+
+# KEYS[1]: 索引  KEYS[2]: 第二个索引（可选，取交集）
+# ARGV[1]: 起始创建时间戳  ARGV[2]: 最大返回数量  ARGV[3]: 最多扫描的条目数  ARGV[4]: 跳过起始时间戳上已扫描的条目数
+# 按创建时间从较小的索引中顺序取出任务ID，并检查是否同时位于另一个索引中。
+# 交集稀疏时每次调用最多扫描 ARGV[3] 个条目，返回 {游标时间戳, 游标跳过数, 任务ID...}，
+# 从游标继续调用即可取下一页；索引已扫描完时游标为空字符串
+LIST_TASKS_SCRIPT = """
+local primary, secondary = KEYS[1], KEYS[2]
+if secondary and redis.call('ZCOUNT', secondary, ARGV[1], '+inf') < redis.call('ZCOUNT', primary, ARGV[1], '+inf') then
+    primary, secondary = secondary, primary
+end
+local limit = tonumber(ARGV[2])
+local budget = tonumber(ARGV[3])
+local score, skip = ARGV[1], tonumber(ARGV[4])
+local result = {}
+while #result < limit do
+    if budget <= 0 then
+        return {score, tostring(skip), unpack(result)}
+    end
+    local count = math.min(limit, budget)
+    local entries = redis.call('ZRANGEBYSCORE', primary, score, '+inf', 'WITHSCORES', 'LIMIT', skip, count)
+    for i = 1, #entries, 2 do
+        local id = entries[i]
+        -- 游标记录最后扫描的条目：其时间戳及该时间戳上已扫描的条目数
+        if entries[i + 1] == score then
+            skip = skip + 1
+        else
+            score, skip = entries[i + 1], 1
+        end
+        budget = budget - 1
+        if not secondary or redis.call('ZSCORE', secondary, id) then
+            result[#result + 1] = id
+            if #result >= limit then
+                break
+            end
+        end
+    end
+    if #entries < count * 2 and #result < limit then
+        return {'', '', unpack(result)}
+    end
+end
+return {score, tostring(skip), unpack(result)}
+"""
+
+
+class TaskRejected(Exception):
+    """模型的排队耗时超过上限，任务未创建"""
+
+    def __init__(self, model_id: str, excess: float):
+        super().__init__(f"Queued work for {model_id} exceeds the limit by {excess:.1f}s")
+        self.model_id = model_id
+        self.excess = excess
+
+
+def build_task(
+    task_id: str,
+    file_url: str,
+    model_id: str,
+    variant: str = "",
+    cost: float = 0.0,
+    max_queued_cost: float = 0.0,
+) -> Tuple[Dict[str, Any], List[str], List[Any]]:
+    """
+    构造任务数据及创建脚本的 keys/args
+
+    Args:
+        cost: 任务的预估推理耗时（秒），计入模型的排队耗时
+        max_queued_cost: 模型排队耗时上限（秒），超出时拒绝创建，0表示不限制
+    """
+    now = datetime.now(UTC)
+    task_data = {
+        "task_id": str(task_id),
+        "file_url": str(file_url),
+        "model_id": str(model_id),
+        "variant": str(variant),
+        "status": "pending",
+        "created_at": now.isoformat(),
+        "created_ts": f"{now.timestamp():.6f}",
+        "error": "",
+        "result": "",
+        "redis_calls": "1",
+        "cost": f"{cost:.6f}",
+    }
+
+    fields = []
+    for key, value in task_data.items():
+        fields.extend([key, value])
+
+    keys = [
+        f"task:{task_id}",
+        settings.TASK_STREAM,
+        status_index("pending"),
+        model_index(model_id),
+        TASK_MODELS_SET,
+        TASK_COST_KEY,
+    ]
+    args = [
+        settings.TASK_STREAM_MAXLEN,
+        task_id,
+        task_data["created_ts"],
+        model_id,
+        "1" if settings.TASK_DISPATCH_MODE == "queue" else "0",
+        task_data["cost"],
+        max_queued_cost,
+        *fields,
+    ]
+    return task_data, keys, args
+
+
+def check_created(model_id: str, response: Any):
+    """创建脚本返回拒绝时抛出 TaskRejected"""
+    if isinstance(response, list) and response and response[0] == "rejected":
+        raise TaskRejected(model_id, float(response[1]))
+
+
+def cancel_task_keys(task_id: str) -> List[str]:
+    """取消脚本的keys"""
+    return [
+        f"task:{task_id}",
+        status_index("pending"),
+        status_index("processing"),
+        status_index("cancelled"),
+        TASK_COST_KEY,
+    ]
+
+
+def delete_task_keys(task_id: str, model_id: str) -> List[str]:
+    """删除脚本的keys"""
+    return [
+        f"task:{task_id}",
+        TASK_COST_KEY,
+        *(status_index(status) for status in TASK_STATUSES),
+        model_index(model_id),
+    ]
+
+
+def list_tasks_args(
+    status: Optional[str] = None,
+    model_id: Optional[str] = None,
+    since: Optional[float] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Tuple[List[str], List[Any]]:
+    """
+    构造列表脚本的 keys/args，至少需要指定状态或模型之一
+
+    Raises:
+        ValueError: 未指定状态和模型，或游标格式错误
+    """
+    keys = []
+    if status:
+        keys.append(status_index(status))
+    if model_id:
+        keys.append(model_index(model_id))
+    if not keys:
+        raise ValueError("status or model_id is required")
+
+    scan = limit * settings.TASK_LIST_SCAN_FACTOR
+    if cursor:
+        # 游标为 "时间戳:跳过数"，由上一页返回，优先于 since
+        score, _, skip = cursor.rpartition(":")
+        try:
+            float(score)
+            skip = int(skip)
+        except ValueError:
+            raise ValueError(f"invalid cursor: {cursor}")
+        return keys, [score, limit, scan, skip]
+
+    return keys, [since if since is not None else "-inf", limit, scan, 0]
+
+
+def parse_task_reply(response: List[str]) -> Optional[Dict[str, Any]]:
+    """解析脚本以 HGETALL 形式返回的任务hash，空列表表示任务不存在"""
+    if not response:
+        return None
+
+    return parse_task(dict(zip(response[::2], response[1::2])))
+
+
+def parse_task(task_data: Dict[str, Any]) -> Dict[str, Any]:
+    """解析任务hash中的JSON字段"""
+    # 解析result字段的JSON字符串
+    if task_data.get("result"):
+        try:
+            task_data["result"] = json.loads(task_data["result"])
+        except json.JSONDecodeError:
+            # 如果解析失败，保持原样
+            pass
+
+    return task_data
+
 
 class RedisClient:
     def __init__(self):
@@ -17,98 +434,578 @@ class RedisClient:
             decode_responses=True,
         )
 
-    def create_task(self, task_id: str, file_url: str, model_id: str) -> Dict[str, Any]:
-        """创建新任务"""
-        task_data = {
-            "task_id": str(task_id),
-            "file_url": str(file_url),
-            "model_id": str(model_id),
-            "status": "pending",
-            "created_at": datetime.now(UTC).isoformat(),
-            "error": "",
-            "result": "",
-        }
+        # 注册Lua脚本，调用时使用EVALSHA，脚本缓存丢失时自动重新加载
+        self._create_script = self.client.register_script(CREATE_TASK_SCRIPT)
+        self._claim_script = self.client.register_script(CLAIM_TASK_SCRIPT)
+        self._finish_script = self.client.register_script(FINISH_TASK_SCRIPT)
+        self._renew_script = self.client.register_script(RENEW_LEASE_SCRIPT)
+        self._get_script = self.client.register_script(GET_TASK_SCRIPT)
+        self._cancel_script = self.client.register_script(CANCEL_TASK_SCRIPT)
+        self._delete_script = self.client.register_script(DELETE_TASK_SCRIPT)
 
-        # 保存任务数据
-        self.client.hmset(f"task:{task_id}", task_data)
+    def create_task(
+        self,
+        task_id: str,
+        file_url: str,
+        model_id: str,
+        variant: str = "",
+        cost: float = 0.0,
+        max_queued_cost: float = 0.0,
+    ) -> Dict[str, Any]:
+        """
+        创建新任务并加入任务队列（一次往返）
+
+        Raises:
+            TaskRejected: 模型排队耗时超过 max_queued_cost 时抛出
+        """
+        task_data, keys, args = build_task(
+            task_id, file_url, model_id, variant, cost, max_queued_cost
+        )
 
-        # 添加到任务队列
-        self.client.lpush("task_queue", task_id)
+        # 保存任务数据并添加到任务队列
+        check_created(model_id, self._create_script(keys=keys, args=args))
 
         return task_data
 
+    def create_tasks(
+        self, tasks: List[Tuple[str, str, str, str, float]]
+    ) -> List[Dict[str, Any]]:
+        """
+        在一个pipeline中批量创建任务（一次往返），不检查排队耗时上限
+
+        Args:
+            tasks: (任务ID, 文件URL, 模型ID, 模型变体, 预估耗时) 列表
+        """
+        pipe = self.client.pipeline(transaction=False)
+        created = []
+        for task_id, file_url, model_id, variant, cost in tasks:
+            task_data, keys, args = build_task(task_id, file_url, model_id, variant, cost)
+            self._create_script(keys=keys, args=args, client=pipe)
+            created.append(task_data)
+
+        pipe.execute()
+        return created
+
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务信息"""
-        task_data = self.client.hgetall(f"task:{task_id}")
-        if not task_data:
-            return None
-
-        # 解析result字段的JSON字符串
-        if task_data.get("result"):
-            try:
-                task_data["result"] = json.loads(task_data["result"])
-            except json.JSONDecodeError:
-                # 如果解析失败，保持原样
-                pass
+        return parse_task_reply(self._get_script(keys=[f"task:{task_id}"]))
 
-        return task_data
+    def get_tasks(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """在一个pipeline中批量获取任务信息，不存在的任务返回None"""
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            self._get_script(keys=[f"task:{task_id}"], client=pipe)
+
+        return [parse_task_reply(response) for response in pipe.execute()]
+
+    def ensure_consumer_group(self):
+        """确保任务队列的消费组存在"""
+        try:
+            self.client.xgroup_create(
+                settings.TASK_STREAM,
+                settings.TASK_CONSUMER_GROUP,
+                id="0",
+                mkstream=True,
+            )
+        except redis.ResponseError as e:
+            # 消费组已存在
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read_tasks(
+        self, consumer: str, count: int = 1, block_ms: Optional[int] = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        阻塞读取分配给当前消费者的新任务
+
+        Returns:
+            (消息ID, 任务ID) 列表，超时返回空列表
+        """
+        response = self.client.xreadgroup(
+            settings.TASK_CONSUMER_GROUP,
+            consumer,
+            {settings.TASK_STREAM: ">"},
+            count=count,
+            block=settings.TASK_BLOCK_TIMEOUT_MS if block_ms is None else block_ms,
+        )
+        if not response:
+            return []
+
+        _, messages = response[0]
+        return [
+            (message_id, (fields or {}).get("task_id"))
+            for message_id, fields in messages
+        ]
+
+    def claim_stale_tasks(
+        self, consumer: str, start_id: str = "0-0", count: int = 10
+    ) -> Tuple[str, List[Tuple[str, Optional[str]]]]:
+        """
+        接管其他消费者长时间未确认的任务（例如worker崩溃）
+
+        Returns:
+            (下一次扫描的起始ID, (消息ID, 任务ID) 列表)
+        """
+        response = self.client.xautoclaim(
+            settings.TASK_STREAM,
+            settings.TASK_CONSUMER_GROUP,
+            consumer,
+            min_idle_time=settings.TASK_CLAIM_IDLE_MS,
+            start_id=start_id,
+            count=count,
+        )
+        next_id, messages = response[0], response[1]
+        return next_id, [
+            (message_id, (fields or {}).get("task_id"))
+            for message_id, fields in messages
+        ]
+
+    def ack_task(self, message_id: str):
+        """确认任务消息已处理完成"""
+        self.client.xack(
+            settings.TASK_STREAM, settings.TASK_CONSUMER_GROUP, message_id
+        )
+
+    def is_task_processing(self, task_id: str) -> bool:
+        """检查任务是否正在处理中"""
+        return self.client.zscore(status_index("processing"), task_id) is not None
+
+    def claim_task(
+        self, task_id: str, message_id: str = "", reclaim: bool = False, owner: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子地认领任务并标记为处理中（一次往返）
+
+        Args:
+            task_id: 任务ID
+            message_id: 任务队列中的消息ID，任务结束时据此确认消息
+            reclaim: 是否允许接管租约已过期的处理中任务（用于崩溃worker遗留的任务）
+            owner: 持有者（消费者名称），处理期间需通过 renew_leases 续约
+
+        Returns:
+            认领成功时返回任务信息，任务不存在或已被认领/结束时返回None
+        """
+        response = self._claim_script(
+            keys=[
+                f"task:{task_id}",
+                status_index("pending"),
+                status_index("processing"),
+                settings.TASK_STREAM,
+            ],
+            args=[
+                task_id,
+                message_id,
+                settings.TASK_CONSUMER_GROUP,
+                datetime.now(UTC).isoformat(),
+                "1" if reclaim else "0",
+                task_channel(task_id),
+                owner,
+                settings.TASK_LEASE_MS,
+            ],
+        )
+        return parse_task_reply(response)
+
+    def renew_leases(self, owner: str, leases: Dict[str, str]) -> List[str]:
+        """
+        在一个pipeline中为持有的任务续约
+
+        Args:
+            owner: 持有者（消费者名称）
+            leases: 任务ID到认领时消息ID的映射
 
-    def update_task_status(
+        Returns:
+            已结束或已被其他worker接管、续约失败的任务ID
+        """
+        pipe = self.client.pipeline(transaction=False)
+        task_ids = list(leases)
+        for task_id in task_ids:
+            self._renew_script(
+                keys=[f"task:{task_id}", settings.TASK_STREAM],
+                args=[owner, leases[task_id], settings.TASK_CONSUMER_GROUP, settings.TASK_LEASE_MS],
+                client=pipe,
+            )
+        return [
+            task_id for task_id, renewed in zip(task_ids, pipe.execute()) if not renewed
+        ]
+
+    def _finish_task(
         self,
         task_id: str,
         status: str,
-        error: Optional[str] = None,
+        error: str = "",
         result: Optional[Dict] = None,
-    ):
-        """更新任务状态"""
-        update_data = {
-            "status": str(status),
-            "error": str(error) if error is not None else "",
-            "completed_at": (
-                datetime.now(UTC).isoformat()
-                if status in ["completed", "failed"]
-                else ""
-            ),
-        }
-
-        if result:
-            # 确保结果中的所有值都是字符串类型
-            update_data["result"] = json.dumps(result)
-
-        self.client.hmset(f"task:{task_id}", update_data)
-
-    def get_next_task(self) -> Optional[str]:
-        """获取下一个待处理任务"""
-        return self.client.rpop("task_queue")
-
-    def is_task_processing(self, task_id: str) -> bool:
-        """检查任务是否正在处理中"""
-        return self.client.sismember("processing_tasks", task_id)
+        owner: str = "",
+        message_id: str = "",
+    ) -> bool:
+        """
+        原子地结束处理中的任务并确认队列消息
 
-    def mark_task_processing(self, task_id: str):
-        """标记任务为处理中"""
-        self.client.sadd("processing_tasks", task_id)
-        self.update_task_status(task_id, "processing")
+        指定 owner 时只有任务仍由该持有者以 message_id 持有才能结束，
+        不指定时（例如完成等待相同输入的任务）不检查持有者
+        """
+        return bool(
+            self._finish_script(
+                keys=[
+                    f"task:{task_id}",
+                    status_index("processing"),
+                    status_index(status),
+                    settings.TASK_STREAM,
+                    TASK_COST_KEY,
+                ],
+                args=[
+                    task_id,
+                    status,
+                    datetime.now(UTC).isoformat(),
+                    error,
+                    json.dumps(result) if result else "",
+                    settings.TASK_CONSUMER_GROUP,
+                    task_channel(task_id),
+                    task_ttl(status),
+                    message_id,
+                    owner,
+                ],
+            )
+        )
 
-    def mark_task_completed(self, task_id: str, result: Dict):
+    def mark_task_completed(
+        self, task_id: str, result: Dict, owner: str = "", message_id: str = ""
+    ) -> bool:
         """标记任务为完成"""
-        self.client.srem("processing_tasks", task_id)
-        self.update_task_status(task_id, "completed", result=result)
+        return self._finish_task(
+            task_id, "completed", result=result, owner=owner, message_id=message_id
+        )
 
-    def mark_task_failed(self, task_id: str, error: str):
+    def mark_task_failed(
+        self, task_id: str, error: str, owner: str = "", message_id: str = ""
+    ) -> bool:
         """标记任务为失败"""
-        self.client.srem("processing_tasks", task_id)
-        self.update_task_status(task_id, "failed", error=error)
+        return self._finish_task(
+            task_id, "failed", error=error, owner=owner, message_id=message_id
+        )
 
-    def delete_task(self, task_id: str) -> bool:
-        """删除任务"""
+    def cancel_task(self, task_id: str) -> bool:
+        """取消待处理或处理中的任务"""
+        return bool(
+            self._cancel_script(
+                keys=cancel_task_keys(task_id),
+                args=[
+                    task_id,
+                    datetime.now(UTC).isoformat(),
+                    task_channel(task_id),
+                    task_ttl("cancelled"),
+                ],
+            )
+        )
+
+    def delete_task(self, task_id: str, model_id: str) -> bool:
+        """删除任务及其索引"""
         try:
-            key = f"task:{task_id}"
-            self.client.delete(key)
+            self._delete_script(keys=delete_task_keys(task_id, model_id), args=[task_id])
             return True
         except Exception as e:
             logger.error(f"Failed to delete task {task_id}: {str(e)}")
             return False
 
+    def delete_tasks(self, tasks: List[Tuple[str, str]]):
+        """
+        在一个pipeline中批量删除任务及其索引
+
+        Args:
+            tasks: (任务ID, 模型ID) 列表
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for task_id, model_id in tasks:
+            self._delete_script(
+                keys=delete_task_keys(task_id, model_id), args=[task_id], client=pipe
+            )
+        pipe.execute()
+
+    def find_task_ids(
+        self, index: str, before: float, limit: int, offset: int = 0
+    ) -> List[str]:
+        """按创建时间顺序取出索引中早于指定时间戳的任务ID"""
+        return self.client.zrangebyscore(
+            index, "-inf", f"({before}", start=offset, num=limit
+        )
+
+    def prune_index(self, index: str, task_ids: List[str]) -> List[str]:
+        """从索引中移除任务hash已过期的任务ID，返回被移除的ID"""
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.exists(f"task:{task_id}")
+        missing = [
+            task_id for task_id, exists in zip(task_ids, pipe.execute()) if not exists
+        ]
+        if missing:
+            self.client.zrem(index, *missing)
+        return missing
+
+    def get_model_ids(self) -> List[str]:
+        """获取出现过的模型ID"""
+        return sorted(self.client.smembers(TASK_MODELS_SET))
+
+
+class TaskEventHub:
+    """
+    在单个Redis连接上按模式订阅所有任务事件，并分发给进程内等待的请求，
+    避免每个长轮询/SSE请求各自占用一个订阅连接
+    """
+
+    def __init__(self, client: aioredis.Redis):
+        self.client = client
+        self._listeners: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _ensure_started(self):
+        """启动后台订阅任务（仅首次或连接断开后）"""
+        async with self._lock:
+            if self._reader is not None and not self._reader.done():
+                return
+
+            pubsub = self.client.pubsub()
+            await pubsub.psubscribe(f"{settings.TASK_EVENTS_CHANNEL_PREFIX}*")
+            # 等待订阅确认，确保之后读取的任务状态不会错过事件
+            await pubsub.get_message(timeout=1.0)
+            self._reader = asyncio.create_task(self._run(pubsub))
+
+    async def _run(self, pubsub: aioredis.client.PubSub):
+        """读取事件并分发给对应任务的监听队列"""
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                try:
+                    event = json.loads(message["data"])
+                except json.JSONDecodeError:
+                    continue
+                for queue in list(self._listeners.get(event.get("task_id"), ())):
+                    queue.put_nowait(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Task event subscription failed: {str(e)}")
+        finally:
+            await pubsub.reset()
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """订阅单个任务的状态事件"""
+        await self._ensure_started()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners[task_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._listeners[task_id].discard(queue)
+            if not self._listeners[task_id]:
+                del self._listeners[task_id]
+
+
+class AsyncRedisClient:
+    """
+    供API使用的异步Redis客户端（redis.asyncio）
+
+    所有请求共享一个有上限的连接池，Redis往返不会阻塞事件循环
+    """
+
+    def __init__(self):
+        self.pool = aioredis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+        self.client = aioredis.Redis(connection_pool=self.pool)
+        self.events = TaskEventHub(self.client)
+
+        # 与同步客户端共用同一组Lua脚本
+        self._create_script = self.client.register_script(CREATE_TASK_SCRIPT)
+        self._get_script = self.client.register_script(GET_TASK_SCRIPT)
+        self._cancel_script = self.client.register_script(CANCEL_TASK_SCRIPT)
+        self._delete_script = self.client.register_script(DELETE_TASK_SCRIPT)
+        self._list_script = self.client.register_script(LIST_TASKS_SCRIPT)
+
+    async def create_task(
+        self,
+        task_id: str,
+        file_url: str,
+        model_id: str,
+        variant: str = "",
+        cost: float = 0.0,
+        max_queued_cost: float = 0.0,
+    ) -> Dict[str, Any]:
+        """
+        创建新任务并加入任务队列（一次往返）
+
+        Raises:
+            TaskRejected: 模型排队耗时超过 max_queued_cost 时抛出
+        """
+        task_data, keys, args = build_task(
+            task_id, file_url, model_id, variant, cost, max_queued_cost
+        )
+        check_created(model_id, await self._create_script(keys=keys, args=args))
+        return task_data
+
+    async def create_tasks(
+        self, tasks: List[Tuple[str, str, str, str, float]]
+    ) -> List[Dict[str, Any]]:
+        """
+        在一个pipeline中批量创建任务（一次往返），不检查排队耗时上限
+
+        Args:
+            tasks: (任务ID, 文件URL, 模型ID, 模型变体, 预估耗时) 列表
+        """
+        pipe = self.client.pipeline(transaction=False)
+        created = []
+        for task_id, file_url, model_id, variant, cost in tasks:
+            task_data, keys, args = build_task(task_id, file_url, model_id, variant, cost)
+            await self._create_script(keys=keys, args=args, client=pipe)
+            created.append(task_data)
+
+        await pipe.execute()
+        return created
+
+    async def get_queued_costs(self) -> Dict[str, float]:
+        """各模型未完成任务的预估推理耗时之和（秒）"""
+        costs = await self.client.hgetall(TASK_COST_KEY)
+        return {model_id: float(cost) for model_id, cost in costs.items()}
+
+    async def set_file_meta(self, object_name: str, width: int, height: int):
+        """记录上传文件的宽高，保留 FILE_META_TTL 秒"""
+        key = f"{FILE_META_PREFIX}{object_name}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(key, mapping={"width": width, "height": height})
+        pipe.expire(key, settings.FILE_META_TTL)
+        await pipe.execute()
+
+    async def get_files_meta(
+        self, object_names: List[str]
+    ) -> List[Optional[Tuple[int, int]]]:
+        """在一个pipeline中获取多个文件的宽高，未记录的文件返回None"""
+        pipe = self.client.pipeline(transaction=False)
+        for object_name in object_names:
+            pipe.hmget(f"{FILE_META_PREFIX}{object_name}", "width", "height")
+        return [
+            (int(width), int(height)) if width and height else None
+            for width, height in await pipe.execute()
+        ]
+
+    async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务信息"""
+        return parse_task_reply(await self._get_script(keys=[f"task:{task_id}"]))
+
+    async def get_tasks(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """在一个pipeline中批量获取任务信息，不存在的任务返回None"""
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            await self._get_script(keys=[f"task:{task_id}"], client=pipe)
+
+        return [parse_task_reply(response) for response in await pipe.execute()]
+
+    async def cancel_task(self, task_id: str) -> bool:
+        """取消待处理或处理中的任务"""
+        return bool(
+            await self._cancel_script(
+                keys=cancel_task_keys(task_id),
+                args=[
+                    task_id,
+                    datetime.now(UTC).isoformat(),
+                    task_channel(task_id),
+                    task_ttl("cancelled"),
+                ],
+            )
+        )
+
+    async def delete_task(self, task_id: str, model_id: str) -> bool:
+        """删除任务及其索引"""
+        try:
+            await self._delete_script(
+                keys=delete_task_keys(task_id, model_id), args=[task_id]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete task {task_id}: {str(e)}")
+            return False
+
+    async def list_tasks(
+        self,
+        status: Optional[str] = None,
+        model_id: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        从状态/模型索引中按创建时间顺序列出任务（两次往返，无需SCAN）
+
+        同时指定状态和模型时每次最多扫描 limit * TASK_LIST_SCAN_FACTOR 个索引条目，
+        返回的任务可能少于 limit，需从返回的游标继续列出
+
+        Args:
+            status: 任务状态
+            model_id: 模型ID
+            since: 只返回该时间戳（秒）之后创建的任务
+            limit: 最大返回数量
+            cursor: 上一页返回的游标
+
+        Returns:
+            (任务列表, 下一页游标)，索引已扫描完时游标为None
+        """
+        keys, args = list_tasks_args(status, model_id, since, limit, cursor)
+        score, skip, *task_ids = await self._list_script(keys=keys, args=args)
+        next_cursor = f"{score}:{skip}" if score else None
+        if not task_ids:
+            return [], next_cursor
+
+        tasks = await self.get_tasks(task_ids)
+        # 任务hash已过期但索引尚未清理的条目直接跳过，由归档任务统一清理
+        return [task for task in tasks if task], next_cursor
+
+    async def watch_task(
+        self, task_id: str, timeout: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        依次产出任务的当前状态及之后每次状态变更，任务结束或超时后停止
+
+        Args:
+            task_id: 任务ID
+            timeout: 最长等待时间（秒）
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        # 先订阅再读取当前状态，避免错过两者之间发生的变更
+        async with self.events.subscribe(task_id) as queue:
+            task = await self.get_task(task_id)
+            if not task:
+                return
+            yield task
+
+            while task.get("status") not in TERMINAL_STATUSES:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return
+
+                task = await self.get_task(task_id)
+                if not task:
+                    return
+                yield task
+
+    async def wait_for_task(
+        self, task_id: str, timeout: float
+    ) -> Optional[Dict[str, Any]]:
+        """等待任务结束（长轮询），超时返回任务的最新状态"""
+        task = None
+        async for task in self.watch_task(task_id, timeout):
+            pass
+        return task
+
 
 redis_client = RedisClient()
+async_redis_client = AsyncRedisClient()
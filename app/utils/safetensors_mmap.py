@@ -0,0 +1,105 @@
+import json
+import mmap
+import struct
+import logging
+from typing import Dict, Tuple
+import torch
+
+logger = logging.getLogger(__name__)
+
+# safetensors 中的 dtype 标识
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def read_header(buffer: mmap.mmap) -> Tuple[Dict[str, Dict], int]:
+    """
+    解析 safetensors 文件头
+
+    文件格式为：8字节小端无符号整数N + N字节JSON头 + 连续的张量数据
+
+    Returns:
+        (张量元信息, 张量数据起始偏移)
+    """
+    (header_size,) = struct.unpack("<Q", buffer[:8])
+    header = json.loads(buffer[8 : 8 + header_size])
+    header.pop("__metadata__", None)
+    return header, 8 + header_size
+
+
+def load_file_mmap(path: str) -> Dict[str, torch.Tensor]:
+    """
+    以内存映射方式加载 safetensors 文件，张量直接引用映射的页面而不复制
+
+    映射使用 ACCESS_COPY（私有写时复制）：只读访问时同一主机上的多个进程共享
+    同一份页缓存，写入只影响当前进程，不会修改文件。
+    数据偏移未按元素大小对齐的张量无法直接映射，退化为复制。
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header, data_start = read_header(buffer)
+
+    state_dict = {}
+    copied = 0
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES.get(info["dtype"])
+        if dtype is None:
+            raise ValueError(f"Unsupported safetensors dtype {info['dtype']} for {name}")
+
+        shape = info["shape"]
+        begin, end = info["data_offsets"]
+        offset = data_start + begin
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        count = (end - begin) // itemsize
+
+        if count == 0:
+            state_dict[name] = torch.empty(shape, dtype=dtype)
+            continue
+
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+        if offset % itemsize:
+            # 未对齐的数据复制到新分配的内存中
+            tensor = tensor.clone()
+            copied += 1
+        state_dict[name] = tensor.view(shape)
+
+    if copied:
+        logger.warning(f"{copied} misaligned tensors in {path} were copied")
+
+    return state_dict
+
+
+def load_into_module(
+    module: torch.nn.Module, path: str, strict: bool = True
+) -> torch.nn.Module:
+    """
+    将 safetensors 权重绑定到模块参数上，不再额外复制一份
+
+    使用 load_state_dict(assign=True) 让参数直接引用映射的张量；
+    与模块参数 dtype 不一致的张量先转换为模块的 dtype（这部分会产生复制）。
+    """
+    state_dict = load_file_mmap(path)
+
+    expected = module.state_dict()
+    converted = 0
+    for name, tensor in state_dict.items():
+        target = expected.get(name)
+        if target is not None and target.dtype != tensor.dtype:
+            state_dict[name] = tensor.to(target.dtype)
+            converted += 1
+    if converted:
+        logger.info(f"Converted {converted} tensors in {path} to the module dtype")
+
+    module.load_state_dict(state_dict, strict=strict, assign=True)
+    return module
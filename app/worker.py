@@ -1,28 +1,110 @@
 import time
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 from app.utils.redis_client import redis_client
 from app.services.task_service import task_service
+from app.core.model_registry import model_registry
 from app.core.config import settings
+import app.models  # noqa: F401  确保模型已注册
 
+logger = logging.getLogger(__name__)
 
-def process_tasks():
-    """处理任务队列中的任务"""
-    while True:
+
+def get_consumer_name() -> str:
+    """生成当前worker在消费组中的名称，与任务租约的持有者一致"""
+    return task_service.owner
+
+
+def collect_messages(consumer: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    阻塞等待第一条任务，随后在批处理窗口内继续收集任务，
+    直到达到 BATCH_MAX_SIZE 或窗口结束
+    """
+    messages = redis_client.read_tasks(consumer, count=settings.BATCH_MAX_SIZE)
+    if not messages:
+        return messages
+
+    deadline = time.monotonic() + settings.BATCH_WINDOW_MS / 1000
+    while len(messages) < settings.BATCH_MAX_SIZE:
+        # block=0 在Redis中表示永久阻塞，因此剩余时间至少为1毫秒
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms < 1:
+            break
+        more = redis_client.read_tasks(
+            consumer,
+            count=settings.BATCH_MAX_SIZE - len(messages),
+            block_ms=remaining_ms,
+        )
+        if not more:
+            break
+        messages.extend(more)
+
+    return messages
+
+
+def handle_messages(messages: List[Tuple[str, Optional[str]]], reclaim: bool = False):
+    """
+    认领任务消息并按模型与变体分组批量处理
+
+    认领与任务结束均由Lua脚本原子完成，并在同一次往返中确认队列消息；
+    处理过程中worker崩溃时消息保持未确认状态，稍后由其他worker接管。
+    """
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+
+    for message_id, task_id in messages:
         try:
-            # 获取下一个任务
-            task_id = redis_client.get_next_task()
             if not task_id:
-                time.sleep(1)  # 没有任务时等待
+                logger.warning(f"Skipping message without task id: {message_id}")
+                redis_client.ack_task(message_id)
                 continue
 
-            # 检查任务是否已在处理中
-            if redis_client.is_task_processing(task_id):
-                continue
+            # 不存在、已结束或已被认领的任务由认领脚本直接确认
+            task = task_service.claim_task(task_id, message_id, reclaim=reclaim)
+            if task:
+                groups[(task["model_id"], task.get("variant", ""))].append(task)
+        except Exception as e:
+            logger.error(f"Error claiming task {task_id}: {str(e)}")
+
+    for (model_id, variant), tasks in groups.items():
+        try:
+            # 同一模型同一变体的任务合并为一次前向推理
+            task_service.process_batch(model_id, tasks, variant)
+        except Exception as e:
+            logger.error(f"Error processing batch for {model_id}: {str(e)}")
+
+
+def process_tasks():
+    """处理任务队列中的任务"""
+    consumer = get_consumer_name()
+    redis_client.ensure_consumer_group()
+
+    # 开始消费前加载并预热模型，首批任务不承担加载耗时
+    if settings.MODEL_PRELOAD:
+        model_registry.preload(settings.MODEL_PRELOAD, settings.MODEL_WARMUP_SIZES)
+    logger.info(f"Worker {consumer} listening on {settings.TASK_STREAM}")
+
+    claim_start_id = "0-0"
+    last_claim = 0.0
+    while True:
+        try:
+            # 定期接管崩溃worker遗留的未确认任务
+            if time.monotonic() - last_claim >= settings.TASK_CLAIM_INTERVAL:
+                last_claim = time.monotonic()
+                claim_start_id, messages = redis_client.claim_stale_tasks(
+                    consumer, start_id=claim_start_id
+                )
+                if messages:
+                    logger.info(f"Reclaimed {len(messages)} stale tasks")
+                    handle_messages(messages, reclaim=True)
 
-            # 处理任务
-            task_service.process_task(task_id)
+            # 阻塞等待新任务，无任务时由Redis挂起连接而不是轮询
+            messages = collect_messages(consumer)
+            if messages:
+                handle_messages(messages)
 
         except Exception as e:
-            print(f"Error processing task: {str(e)}")
+            logger.error(f"Error reading task queue: {str(e)}")
             time.sleep(1)  # 发生错误时等待
 
 
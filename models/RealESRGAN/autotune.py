@@ -0,0 +1,230 @@
+""" Memory-aware tile and batch size selection for RealESRGAN.predict.
+
+A one-time calibration measures, on the current host and device, how much
+memory one input pixel of a tile costs at a given scale and how long a pixel
+takes for a few tile sizes. The table is stored as JSON and reused by every
+process; plan() then picks the tile size and batch size for an image from the
+scale, the image dimensions and a memory budget.
+"""
+import json
+import math
+import os
+import platform
+import threading
+import time
+
+import torch
+
+# tile sizes (without overlap) tried during calibration and planning
+CANDIDATE_TILES = (128, 192, 256, 384, 512)
+DEFAULT_PLAN = dict(batch_size=4, patches_size=192, padding=24)
+MAX_BATCH_SIZE = 16
+# live activations per forward are a few times the largest single feature map
+ACTIVATION_FACTOR = 3
+
+
+def device_key(device):
+    """ Identifies the hardware a calibration was measured on. """
+    if device.type == 'cuda':
+        return f"cuda:{torch.cuda.get_device_name(device)}"
+    return f"cpu:{platform.machine()}:{os.cpu_count()}"
+
+
+def _largest_activation_bytes(model, x):
+    """ Runs one forward pass and returns the size of the largest leaf module output. """
+    largest = [0]
+
+    def hook(_module, _inputs, output):
+        if isinstance(output, torch.Tensor):
+            largest[0] = max(largest[0], output.numel() * output.element_size())
+
+    handles = [
+        module.register_forward_hook(hook)
+        for module in model.modules()
+        if not list(module.children())
+    ]
+    try:
+        model(x)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return largest[0]
+
+
+def calibrate(model, device, padding=24, tiles=(64, 128, 192)):
+    """ Measures bytes and seconds per input pixel of a single-tile forward pass.
+
+    Returns:
+        dict(bytes_per_pixel=float, seconds_per_pixel={tile: float})
+    """
+    bytes_per_pixel = 0.0
+    seconds_per_pixel = {}
+
+    with torch.no_grad():
+        for tile in tiles:
+            side = tile + 2 * padding
+            pixels = side * side
+            x = torch.rand((1, 3, side, side), device=device)
+            model(x)  # warm-up
+
+            if device.type == 'cuda':
+                torch.cuda.synchronize(device)
+                torch.cuda.reset_peak_memory_stats(device)
+                baseline = torch.cuda.memory_allocated(device)
+                start = time.perf_counter()
+                model(x)
+                torch.cuda.synchronize(device)
+                elapsed = time.perf_counter() - start
+                used = torch.cuda.max_memory_allocated(device) - baseline
+            else:
+                start = time.perf_counter()
+                model(x)
+                elapsed = time.perf_counter() - start
+                used = ACTIVATION_FACTOR * _largest_activation_bytes(model, x)
+
+            bytes_per_pixel = max(bytes_per_pixel, used / pixels)
+            seconds_per_pixel[tile] = elapsed / pixels
+
+    return dict(bytes_per_pixel=bytes_per_pixel, seconds_per_pixel=seconds_per_pixel)
+
+
+class TileAutoTuner:
+    """ Chooses (patches_size, batch_size, padding) for RealESRGAN.predict.
+
+    Args:
+        path: JSON file holding calibrations, keyed by device and scale.
+        memory_budget: bytes available for activations of one batch.
+        padding: tile overlap in input pixels.
+    """
+
+    def __init__(self, path, memory_budget, padding=24):
+        self.path = path
+        self.memory_budget = memory_budget
+        self.padding = padding
+        self._lock = threading.Lock()
+        self._table = self._read()
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._table, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def calibration(self, device, scale):
+        return self._table.get(device_key(device), {}).get(str(scale))
+
+    def ensure_calibrated(self, model, device, scale):
+        """ Calibrates once per (device, scale) and persists the result. """
+        with self._lock:
+            entry = self.calibration(device, scale)
+            if entry is not None:
+                return entry
+
+            # another process may have calibrated meanwhile
+            self._table = self._read()
+            entry = self.calibration(device, scale)
+            if entry is not None:
+                return entry
+
+            entry = calibrate(model, device, self.padding)
+            self._table.setdefault(device_key(device), {})[str(scale)] = entry
+            if self.path:
+                self._write()
+            return entry
+
+    def _seconds_per_pixel(self, entry, tile):
+        """ Interpolates the measured time per pixel to a tile size. """
+        measured = sorted((int(size), seconds) for size, seconds in entry['seconds_per_pixel'].items())
+        if not measured:
+            return 1.0
+        for size, seconds in measured:
+            if tile <= size:
+                return seconds
+        return measured[-1][1]
+
+    def plan(self, height, width, device, scale, pad_size=15):
+        """ Picks the tile and batch size for an image of height x width input pixels.
+
+        Returns:
+            dict(batch_size, patches_size, padding) for RealESRGAN.predict
+        """
+        entry = self.calibration(device, scale)
+        if entry is None or self.memory_budget <= 0:
+            return dict(DEFAULT_PLAN)
+
+        padded_h = height + 2 * pad_size
+        padded_w = width + 2 * pad_size
+        tiled = self._best_tiling(entry, [(padded_h, padded_w)])
+
+        # the whole (padded) image as one tile, no overlap needed;
+        # rounded up so pixel-unshuffle (x2) always gets an even size.
+        # Tiles are square, so an elongated image would mostly run the network on
+        # padding: only use the single tile when it is cheaper than tiling.
+        single = math.ceil(max(padded_h, padded_w) / 8) * 8
+        if single * single * entry['bytes_per_pixel'] <= self.memory_budget:
+            single_cost = single * single * self._seconds_per_pixel(entry, single)
+            if tiled is None or single_cost <= tiled[0]:
+                return dict(batch_size=1, patches_size=single, padding=0)
+
+        return self._tiled_plan(tiled)
+
+    def plan_batch(self, sizes, device, scale, pad_size=15):
+        """ Picks one tiling shared by several images so their tiles can be batched together.
+
+        Args:
+            sizes: list of (height, width) input sizes
+        Returns:
+            dict(batch_size, patches_size, padding) for RealESRGAN.predict_arrays
+        """
+        if len(sizes) == 1:
+            return self.plan(sizes[0][0], sizes[0][1], device, scale, pad_size)
+
+        entry = self.calibration(device, scale)
+        if entry is None or self.memory_budget <= 0:
+            return dict(DEFAULT_PLAN)
+        return self._tiled_plan(self._best_tiling(
+            entry, [(height + 2 * pad_size, width + 2 * pad_size) for height, width in sizes]
+        ))
+
+    def _best_tiling(self, entry, padded_sizes):
+        """ Cheapest candidate tile size for the given padded images, with the largest batch that fits.
+
+        Returns:
+            (estimated seconds, tile, batch), or None when no candidate fits the budget
+        """
+        bytes_per_pixel = entry['bytes_per_pixel']
+        best = None
+        for tile in CANDIDATE_TILES:
+            side = tile + 2 * self.padding
+            per_tile = side * side * bytes_per_pixel
+            if per_tile > self.memory_budget:
+                continue
+            n_tiles = sum(
+                math.ceil(height / tile) * math.ceil(width / tile)
+                for height, width in padded_sizes
+            )
+            batch = int(min(MAX_BATCH_SIZE, n_tiles, self.memory_budget // per_tile))
+            cost = n_tiles * side * side * self._seconds_per_pixel(entry, tile)
+            if best is None or cost < best[0]:
+                best = (cost, tile, batch)
+        return best
+
+    def _tiled_plan(self, best):
+        """ Plan for the result of _best_tiling. """
+        if best is None:
+            # nothing fits the budget: smallest tile, one at a time
+            return dict(batch_size=1, patches_size=CANDIDATE_TILES[0], padding=self.padding)
+        _, tile, batch = best
+        return dict(batch_size=batch, patches_size=tile, padding=self.padding)
@@ -0,0 +1,277 @@
+""" Benchmarks for the RealESRGAN tiling helpers.
+
+Compares the vectorized helpers in utils.py with the original loop-based
+implementations (kept below as the reference) on square inputs, checking that
+outputs are identical and reporting time and peak allocation.
+
+With --rrdbnet, checks that InplaceRRDBNet loads RRDBNet weights and gives
+the same output, and compares the forward time of both networks.
+
+With --flat-eval, runs the model on real images instead and compares
+flat-tile skipping against full inference: share of skipped tiles, time and
+PSNR of the skipped result against the full one.
+
+Usage:
+    python -m models.RealESRGAN.benchmark --sizes 1000 2000 3600 --scale 4
+    python -m models.RealESRGAN.benchmark --rrdbnet --scale 4 --batch-size 4
+    python -m models.RealESRGAN.benchmark --flat-eval a.jpg b.jpg \
+        --weights models/RealESRGAN/RealESRGAN_x4plus.pth --thresholds 2 4 8
+"""
+import os
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from .utils import pad_reflect, split_image_into_overlapping_patches, stich_together
+
+
+# ---------------------------------------------------------------------------
+# Reference implementations (the original utils.py versions)
+# ---------------------------------------------------------------------------
+
+def legacy_pad_reflect(image, pad_size):
+    imsize = image.shape
+    height, width = imsize[:2]
+    new_img = np.zeros([height+pad_size*2, width+pad_size*2, imsize[2]]).astype(np.uint8)
+    new_img[pad_size:-pad_size, pad_size:-pad_size, :] = image
+
+    new_img[0:pad_size, pad_size:-pad_size, :] = np.flip(image[0:pad_size, :, :], axis=0) #top
+    new_img[-pad_size:, pad_size:-pad_size, :] = np.flip(image[-pad_size:, :, :], axis=0) #bottom
+    new_img[:, 0:pad_size, :] = np.flip(new_img[:, pad_size:pad_size*2, :], axis=1) #left
+    new_img[:, -pad_size:, :] = np.flip(new_img[:, -pad_size*2:-pad_size, :], axis=1) #right
+
+    return new_img
+
+
+def legacy_split_image_into_overlapping_patches(image_array, patch_size, padding_size=2):
+    xmax, ymax, _ = image_array.shape
+    x_remainder = xmax % patch_size
+    y_remainder = ymax % patch_size
+
+    x_extend = (patch_size - x_remainder) % patch_size
+    y_extend = (patch_size - y_remainder) % patch_size
+
+    extended_image = np.pad(image_array, ((0, x_extend), (0, y_extend), (0, 0)), 'edge')
+    padded_image = np.pad(
+        extended_image,
+        ((padding_size, padding_size), (padding_size, padding_size), (0, 0)),
+        'edge',
+    )
+
+    xmax, ymax, _ = padded_image.shape
+    patches = []
+
+    x_lefts = range(padding_size, xmax - padding_size, patch_size)
+    y_tops = range(padding_size, ymax - padding_size, patch_size)
+
+    for x in x_lefts:
+        for y in y_tops:
+            x_left = x - padding_size
+            y_top = y - padding_size
+            x_right = x + patch_size + padding_size
+            y_bottom = y + patch_size + padding_size
+            patch = padded_image[x_left:x_right, y_top:y_bottom, :]
+            patches.append(patch)
+
+    return np.array(patches), padded_image.shape
+
+
+def legacy_stich_together(patches, padded_image_shape, target_shape, padding_size=4):
+    xmax, ymax, _ = padded_image_shape
+    patches = patches[:, padding_size:-padding_size, padding_size:-padding_size, :]
+    patch_size = patches.shape[1]
+    n_patches_per_row = ymax // patch_size
+
+    complete_image = np.zeros((xmax, ymax, 3))
+
+    row = -1
+    col = 0
+    for i in range(len(patches)):
+        if i % n_patches_per_row == 0:
+            row += 1
+            col = 0
+        complete_image[
+        row * patch_size: (row + 1) * patch_size, col * patch_size: (col + 1) * patch_size,:
+        ] = patches[i]
+        col += 1
+    return complete_image[0: target_shape[0], 0: target_shape[1], :]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def measure(func, *args, repeat=3, **kwargs):
+    """ Returns (result, best wall time in seconds, peak traced allocation in bytes). """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        result = None
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def upscaled_patches(patches, scale, rng):
+    """ Fake model output: float32 patches scaled by `scale` in both dimensions. """
+    n, h, w, c = patches.shape
+    return rng.random((n, h * scale, w * scale, c), dtype=np.float32)
+
+
+def run(sizes, scale=4, patch_size=192, padding=24, pad_size=15, repeat=3, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for size in sizes:
+        image = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+        old_padded, t_old, m_old = measure(legacy_pad_reflect, image, pad_size, repeat=repeat)
+        new_padded, t_new, m_new = measure(pad_reflect, image, pad_size, repeat=repeat)
+        assert np.array_equal(old_padded, new_padded), "pad_reflect mismatch"
+        rows.append((size, 'pad_reflect', t_old, t_new, m_old, m_new))
+
+        (old_patches, old_shape), t_old, m_old = measure(
+            legacy_split_image_into_overlapping_patches, new_padded, patch_size, padding, repeat=repeat
+        )
+        (new_patches, new_shape), t_new, m_new = measure(
+            split_image_into_overlapping_patches, new_padded, patch_size, padding, repeat=repeat
+        )
+        assert old_shape == new_shape and np.array_equal(old_patches, new_patches), "split mismatch"
+        rows.append((size, 'split', t_old, t_new, m_old, m_new))
+
+        sr_patches = upscaled_patches(new_patches, scale, rng)
+        padded_scaled = tuple(np.multiply(new_shape[0:2], scale)) + (3,)
+        target_scaled = tuple(np.multiply(new_padded.shape[0:2], scale)) + (3,)
+        old_image, t_old, m_old = measure(
+            legacy_stich_together, sr_patches, padded_scaled, target_scaled, padding * scale, repeat=repeat
+        )
+        new_image, t_new, m_new = measure(
+            stich_together, sr_patches, padded_scaled, target_scaled, padding * scale, repeat=repeat
+        )
+        assert np.array_equal(old_image, new_image), "stitch mismatch"
+        rows.append((size, f'stitch x{scale}', t_old, t_new, m_old, m_new))
+        del sr_patches, old_image, new_image
+
+    print(f"{'size':>6} {'op':<12} {'legacy s':>10} {'new s':>10} {'speedup':>8} {'legacy MB':>10} {'new MB':>10}")
+    for size, op, t_old, t_new, m_old, m_new in rows:
+        print(
+            f"{size:>6} {op:<12} {t_old:>10.4f} {t_new:>10.4f} {t_old / max(t_new, 1e-9):>7.1f}x "
+            f"{m_old / 2**20:>10.1f} {m_new / 2**20:>10.1f}"
+        )
+    return rows
+
+
+def compare_rrdbnet(scale=4, tile=240, batch_size=4, num_block=23, repeat=3, seed=0):
+    """ Parity and speed of InplaceRRDBNet against RRDBNet on random tiles. """
+    import torch
+
+    from .rrdbnet_arch import InplaceRRDBNet, RRDBNet
+
+    torch.manual_seed(seed)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    config = dict(num_in_ch=3, num_out_ch=3, scale=scale, num_feat=64, num_block=num_block, num_grow_ch=32)
+    reference = RRDBNet(**config).eval().to(device)
+    inplace = InplaceRRDBNet(**config).eval().to(device)
+    inplace.load_state_dict(reference.state_dict(), strict=True)
+
+    x = torch.rand((batch_size, 3, tile, tile), device=device)
+
+    def forward(network):
+        with torch.no_grad():
+            out = network(x)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        return out
+
+    expected, t_old, _ = measure(forward, reference, repeat=repeat)
+    actual, t_new, _ = measure(forward, inplace, repeat=repeat)
+    max_diff = (expected - actual).abs().max().item()
+    assert torch.allclose(expected, actual, rtol=1e-4, atol=1e-5), f"InplaceRRDBNet mismatch: {max_diff}"
+
+    print(f"{'network':<16} {'seconds':>10}")
+    print(f"{'RRDBNet':<16} {t_old:>10.4f}")
+    print(f"{'InplaceRRDBNet':<16} {t_new:>10.4f}")
+    print(f"speedup {t_old / max(t_new, 1e-9):.2f}x, max abs diff {max_diff:.2e}")
+    return t_old, t_new, max_diff
+
+
+def psnr(reference, image):
+    """ Peak signal-to-noise ratio of two uint8 images, in dB. """
+    mse = np.mean((reference.astype(np.float64) - image) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def evaluate_flat_skip(weights, images, scale=4, thresholds=(2, 4, 8), patch_size=192, padding=24):
+    """ Compares flat-tile skipping at each threshold with full inference on real images. """
+    import torch
+    from PIL import Image
+
+    from .model import RealESRGAN
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = RealESRGAN(device, scale=scale)
+    model.load_weights(weights, download=False)
+    plan = dict(patches_size=patch_size, padding=padding)
+
+    rows = []
+    for path in images:
+        image = np.array(Image.open(path).convert('RGB'))
+        start = time.perf_counter()
+        full = model.predict_array(image, **plan)
+        t_full = time.perf_counter() - start
+
+        for threshold in thresholds:
+            stats = {}
+            start = time.perf_counter()
+            skipped = model.predict_array(image, flat_threshold=threshold, stats=stats, **plan)
+            t_skip = time.perf_counter() - start
+            ratio = stats['skipped'] / max(stats['tiles'], 1)
+            rows.append((os.path.basename(path), threshold, ratio, t_full, t_skip, psnr(full, skipped)))
+
+    print(f"{'image':<24} {'threshold':>9} {'skipped':>8} {'full s':>8} {'skip s':>8} {'PSNR dB':>8}")
+    for name, threshold, ratio, t_full, t_skip, value in rows:
+        print(
+            f"{name[:24]:<24} {threshold:>9.1f} {ratio:>7.1%} {t_full:>8.2f} {t_skip:>8.2f} {value:>8.2f}"
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RealESRGAN tiling helpers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 3600])
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--patch-size", type=int, default=192)
+    parser.add_argument("--padding", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rrdbnet", action="store_true", help="compare InplaceRRDBNet with RRDBNet")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--num-block", type=int, default=23)
+    parser.add_argument("--flat-eval", nargs="+", metavar="IMAGE", help="evaluate flat-tile skipping on these images")
+    parser.add_argument("--weights", help="model weights for --flat-eval")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[2, 4, 8])
+    args = parser.parse_args()
+    if args.rrdbnet:
+        compare_rrdbnet(
+            args.scale, args.patch_size + 2 * args.padding, args.batch_size, args.num_block, args.repeat
+        )
+        return
+    if args.flat_eval:
+        if not args.weights:
+            parser.error("--flat-eval requires --weights")
+        evaluate_flat_skip(
+            args.weights, args.flat_eval, args.scale, args.thresholds, args.patch_size, args.padding
+        )
+        return
+    run(args.sizes, args.scale, args.patch_size, args.padding, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
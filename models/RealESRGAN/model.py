@@ -1,4 +1,5 @@
 import os
+from contextlib import nullcontext
 import torch
 from torch.nn import functional as F
 from PIL import Image
@@ -6,13 +7,8 @@ import numpy as np
 import cv2
 from huggingface_hub import hf_hub_download
 
-from .rrdbnet_arch import RRDBNet
-from .utils import (
-    pad_reflect,
-    split_image_into_overlapping_patches,
-    stich_together,
-    unpad_image,
-)
+from .rrdbnet_arch import InplaceRRDBNet, RRDBNet
+from .utils import overlapping_patch_view, pad_reflect, tile_flatness
 
 
 HF_MODELS = {
@@ -32,10 +28,12 @@ HF_MODELS = {
 
 
 class RealESRGAN:
-    def __init__(self, device, scale=4):
+    def __init__(self, device, scale=4, inplace=False):
+        """inplace selects InplaceRRDBNet, the weight-compatible inference variant of RRDBNet."""
         self.device = device
         self.scale = scale
-        self.model = RRDBNet(
+        network = InplaceRRDBNet if inplace else RRDBNet
+        self.model = network(
             num_in_ch=3,
             num_out_ch=3,
             num_feat=64,
@@ -44,7 +42,7 @@ class RealESRGAN:
             scale=scale,
         )
 
-    def load_weights(self, model_path, download=True):
+    def load_weights(self, model_path, download=True, to_device=True):
         if not os.path.exists(model_path) and download:
             assert self.scale in [
                 2,
@@ -62,7 +60,7 @@ class RealESRGAN:
             )
             print("Weights downloaded to:", os.path.join(cache_dir, local_filename))
 
-        loadnet = torch.load(model_path)
+        loadnet = torch.load(model_path, map_location="cpu")
         if "params" in loadnet:
             self.model.load_state_dict(loadnet["params"], strict=True)
         elif "params_ema" in loadnet:
@@ -70,47 +68,189 @@ class RealESRGAN:
         else:
             self.model.load_state_dict(loadnet, strict=True)
         self.model.eval()
-        self.model.to(self.device)
+        if to_device:
+            self.model.to(self.device)
 
-    def predict(
-        self, lr_image, batch_size=4, patches_size=192, padding=24, pad_size=15
+    def predict(self, lr_image, **kwargs):
+        """Upscales a PIL image, returning a PIL image. See predict_array."""
+        return Image.fromarray(self.predict_array(lr_image, **kwargs))
+
+    def predict_array(
+        self, lr_image, batch_size=4, patches_size=192, padding=24, pad_size=15,
+        flat_threshold=0, stats=None,
     ):
-        scale = self.scale
-        device = self.device
-        lr_image = np.array(lr_image)
-        lr_image = pad_reflect(lr_image, pad_size)
+        """Upscales a PIL image (or HxWx3 uint8 array) tile by tile into an HxWx3 uint8 array.
+
+        Tiles are normalized, inferred and written back one batch at a time: the
+        de-padded output of each tile is copied straight into a preallocated uint8
+        image, so peak memory is about the output image plus one batch.
+        See predict_arrays for flat_threshold and stats.
+        """
+        return self.predict_arrays(
+            [lr_image], batch_size=batch_size, patches_size=patches_size,
+            padding=padding, pad_size=pad_size, flat_threshold=flat_threshold,
+            stats=stats,
+        )[0]
+
+    def predict_arrays(
+        self, lr_images, batch_size=4, patches_size=192, padding=24, pad_size=15,
+        flat_threshold=0, stats=None,
+    ):
+        """Upscales several images with one tile stream.
+
+        Tiles of all images are packed into the same batches, so many small images
+        run as full batches instead of one partial batch each; every output tile is
+        routed back to the canvas of the image it came from.
+
+        With flat_threshold > 0, tiles whose tile_flatness score is below it skip
+        the network and are resampled bicubically; network tiles next to them fade
+        their overlap into the resampled neighbour to hide the seam. If stats is a
+        dict, the "tiles" and "skipped" counts are added to it, and "images" is
+        extended with one dict(tiles, skipped) per input image, in input order.
+        """
+        jobs = [
+            self._prepare_tiles(lr_image, patches_size, padding, pad_size)
+            for lr_image in lr_images
+        ]
+
+        tile = patches_size * self.scale
+        tile_padding = padding * self.scale
+        skip = flat_threshold > 0
+        blend = skip and tile_padding > 0
+
+        n_skipped = 0
+        for job in jobs:
+            job["flat"] = (
+                tile_flatness(job["patches"]) < flat_threshold
+                if skip
+                else np.zeros((job["rows"], job["cols"]), dtype=bool)
+            )
+            for row, col in zip(*np.nonzero(job["flat"])):
+                self._paste_tile(
+                    job["output"],
+                    self._resample_tile(job["patches"][row, col], tile, tile_padding),
+                    row * tile - job["offset"], col * tile - job["offset"],
+                )
+            n_skipped += int(job["flat"].sum())
+
+        tiles = [
+            (job, row, col)
+            for job in jobs
+            for row in range(job["rows"])
+            for col in range(job["cols"])
+            if not job["flat"][row, col]
+        ]
+        if stats is not None:
+            stats["tiles"] = stats.get("tiles", 0) + len(tiles) + n_skipped
+            stats["skipped"] = stats.get("skipped", 0) + n_skipped
+            stats.setdefault("images", []).extend(
+                dict(tiles=job["rows"] * job["cols"], skipped=int(job["flat"].sum()))
+                for job in jobs
+            )
 
-        patches, p_shape = split_image_into_overlapping_patches(
+        # 根据设备类型选择是否使用amp
+        autocast = (
+            torch.amp.autocast("cuda") if self.device.type == "cuda" else nullcontext()
+        )
+        with torch.no_grad(), autocast:
+            for start in range(0, len(tiles), batch_size):
+                chunk = tiles[start : start + batch_size]
+                batch = np.stack([job["patches"][row, col] for job, row, col in chunk])
+                img = torch.from_numpy(batch).permute((0, 3, 1, 2)).to(self.device)
+                res = self.model(img.float().div_(255))
+
+                # drop the overlap (kept for blending into flat neighbours),
+                # then quantize on the device and copy back as uint8
+                if not blend:
+                    res = res[
+                        :, :, tile_padding : tile_padding + tile, tile_padding : tile_padding + tile
+                    ]
+                res = res.float().clamp_(0, 1).mul_(255).to(torch.uint8)
+                res = res.permute((0, 2, 3, 1)).cpu().numpy()
+
+                for (job, row, col), sr_tile in zip(chunk, res):
+                    top, left = row * tile - job["offset"], col * tile - job["offset"]
+                    if blend:
+                        self._blend_flat_neighbours(
+                            job, row, col, sr_tile, top, left, tile, tile_padding
+                        )
+                        sr_tile = sr_tile[
+                            tile_padding : tile_padding + tile, tile_padding : tile_padding + tile
+                        ]
+                    self._paste_tile(job["output"], sr_tile, top, left)
+
+        return [job["output"] for job in jobs]
+
+    def _prepare_tiles(self, lr_image, patches_size, padding, pad_size):
+        """Pads one image and allocates its output canvas; tiles stay a strided view."""
+        scale = self.scale
+        lr_image = pad_reflect(np.array(lr_image), pad_size)
+        patches, _ = overlapping_patch_view(
             lr_image, patch_size=patches_size, padding_size=padding
         )
-        img = torch.FloatTensor(patches / 255).permute((0, 3, 1, 2)).to(device).detach()
-
-        with torch.no_grad():
-            # 根据设备类型选择是否使用amp
-            if device.type == "cuda":
-                with torch.amp.autocast("cuda"):
-                    res = self.model(img[0:batch_size])
-                    for i in range(batch_size, img.shape[0], batch_size):
-                        res = torch.cat((res, self.model(img[i : i + batch_size])), 0)
-            else:
-                res = self.model(img[0:batch_size])
-                for i in range(batch_size, img.shape[0], batch_size):
-                    res = torch.cat((res, self.model(img[i : i + batch_size])), 0)
-
-        sr_image = res.permute((0, 2, 3, 1)).clamp_(0, 1).cpu()
-        np_sr_image = sr_image.numpy()
-
-        padded_size_scaled = tuple(np.multiply(p_shape[0:2], scale)) + (3,)
-        scaled_image_shape = tuple(np.multiply(lr_image.shape[0:2], scale)) + (3,)
-
-        np_sr_image = stich_together(
-            np_sr_image,
-            padded_image_shape=padded_size_scaled,
-            target_shape=scaled_image_shape,
-            padding_size=padding * scale,
+        height = (lr_image.shape[0] - 2 * pad_size) * scale
+        width = (lr_image.shape[1] - 2 * pad_size) * scale
+        return dict(
+            patches=patches,
+            rows=patches.shape[0],
+            cols=patches.shape[1],
+            offset=pad_size * scale,
+            output=np.empty((height, width, 3), dtype=np.uint8),
         )
-        sr_img = (np_sr_image * 255).astype(np.uint8)
-        sr_img = unpad_image(sr_img, pad_size * scale)
-        sr_img = Image.fromarray(sr_img)
 
-        return sr_img
+    def _resample_tile(self, patch, tile, tile_padding):
+        """Bicubic upscale of a padded input tile, cropped to its core."""
+        height, width = patch.shape[:2]
+        sr_patch = cv2.resize(
+            np.ascontiguousarray(patch),
+            (width * self.scale, height * self.scale),
+            interpolation=cv2.INTER_CUBIC,
+        )
+        return sr_patch[tile_padding : tile_padding + tile, tile_padding : tile_padding + tile]
+
+    def _blend_flat_neighbours(self, job, row, col, sr_tile, top, left, tile, tile_padding):
+        """Fades the overlap of a network tile into each flat neighbour already on the canvas.
+
+        The weight of the network output falls linearly from 1 at the shared edge
+        to 0 at tile_padding pixels inside the neighbour.
+        """
+        ramp = (np.arange(tile_padding, dtype=np.float32) + 0.5) / tile_padding
+        core = slice(tile_padding, tile_padding + tile)
+        after = slice(tile_padding + tile, None)
+        sides = (
+            # (neighbour, band of sr_tile, band position, weights)
+            ((row - 1, col), sr_tile[:tile_padding, core], (top - tile_padding, left), ramp[:, None]),
+            ((row + 1, col), sr_tile[after, core], (top + tile, left), ramp[::-1, None]),
+            ((row, col - 1), sr_tile[core, :tile_padding], (top, left - tile_padding), ramp[None, :]),
+            ((row, col + 1), sr_tile[core, after], (top, left + tile), ramp[None, ::-1]),
+        )
+        flat = job["flat"]
+        for (n_row, n_col), band, (band_top, band_left), weights in sides:
+            if 0 <= n_row < job["rows"] and 0 <= n_col < job["cols"] and flat[n_row, n_col]:
+                self._blend_tile(
+                    job["output"], band, np.broadcast_to(weights, band.shape[:2]),
+                    band_top, band_left,
+                )
+
+    @staticmethod
+    def _blend_tile(output, band, weights, top, left):
+        """Like _paste_tile, but mixes band into output with per-pixel weights of band."""
+        y0, x0 = max(top, 0), max(left, 0)
+        y1 = min(top + band.shape[0], output.shape[0])
+        x1 = min(left + band.shape[1], output.shape[1])
+        if y0 >= y1 or x0 >= x1:
+            return
+        src = band[y0 - top : y1 - top, x0 - left : x1 - left].astype(np.float32)
+        weight = weights[y0 - top : y1 - top, x0 - left : x1 - left, None]
+        dst = output[y0:y1, x0:x1]
+        dst[...] = np.rint(dst + weight * (src - dst)).astype(np.uint8)
+
+    @staticmethod
+    def _paste_tile(output, sr_tile, top, left):
+        """Copies the part of sr_tile that falls inside output, with its top-left corner at (top, left)."""
+        y0, x0 = max(top, 0), max(left, 0)
+        y1 = min(top + sr_tile.shape[0], output.shape[0])
+        x1 = min(left + sr_tile.shape[1], output.shape[1])
+        if y0 >= y1 or x0 >= x1:
+            return
+        output[y0:y1, x0:x1] = sr_tile[y0 - top : y1 - top, x0 - left : x1 - left]
@@ -46,13 +46,14 @@ class RRDB(nn.Module):
     Args:
         num_feat (int): Channel number of intermediate features.
         num_grow_ch (int): Channels for each growth.
+        rdb_cls (type): Residual dense block class. Default: ResidualDenseBlock.
     """
 
-    def __init__(self, num_feat, num_grow_ch=32):
+    def __init__(self, num_feat, num_grow_ch=32, rdb_cls=ResidualDenseBlock):
         super(RRDB, self).__init__()
-        self.rdb1 = ResidualDenseBlock(num_feat, num_grow_ch)
-        self.rdb2 = ResidualDenseBlock(num_feat, num_grow_ch)
-        self.rdb3 = ResidualDenseBlock(num_feat, num_grow_ch)
+        self.rdb1 = rdb_cls(num_feat, num_grow_ch)
+        self.rdb2 = rdb_cls(num_feat, num_grow_ch)
+        self.rdb3 = rdb_cls(num_feat, num_grow_ch)
 
     def forward(self, x):
         out = self.rdb1(x)
@@ -80,9 +81,11 @@ class RRDBNet(nn.Module):
             Default: 64
         num_block (int): Block number in the trunk network. Defaults: 23
         num_grow_ch (int): Channels for each growth. Default: 32.
+        block_cls (type): Trunk block class. Default: RRDB.
     """
 
-    def __init__(self, num_in_ch, num_out_ch, scale=4, num_feat=64, num_block=23, num_grow_ch=32):
+    def __init__(self, num_in_ch, num_out_ch, scale=4, num_feat=64, num_block=23, num_grow_ch=32,
+                 block_cls=RRDB):
         super(RRDBNet, self).__init__()
         self.scale = scale
         if scale == 2:
@@ -90,7 +93,7 @@ class RRDBNet(nn.Module):
         elif scale == 1:
             num_in_ch = num_in_ch * 16
         self.conv_first = nn.Conv2d(num_in_ch, num_feat, 3, 1, 1)
-        self.body = make_layer(RRDB, num_block, num_feat=num_feat, num_grow_ch=num_grow_ch)
+        self.body = make_layer(block_cls, num_block, num_feat=num_feat, num_grow_ch=num_grow_ch)
         self.conv_body = nn.Conv2d(num_feat, num_feat, 3, 1, 1)
         # upsample
         self.conv_up1 = nn.Conv2d(num_feat, num_feat, 3, 1, 1)
@@ -110,8 +113,7 @@ class RRDBNet(nn.Module):
         else:
             feat = x
         feat = self.conv_first(feat)
-        body_feat = self.conv_body(self.body(feat))
-        feat = feat + body_feat
+        feat = feat + self.trunk(feat)
         # upsample
         feat = self.lrelu(self.conv_up1(F.interpolate(feat, scale_factor=2, mode='nearest')))
         feat = self.lrelu(self.conv_up2(F.interpolate(feat, scale_factor=2, mode='nearest')))
@@ -119,3 +121,88 @@ class RRDBNet(nn.Module):
             feat = self.lrelu(self.conv_up3(F.interpolate(feat, scale_factor=2, mode='nearest')))
         out = self.conv_last(self.lrelu(self.conv_hr(feat)))
         return out
+
+    def trunk(self, feat):
+        """RRDB trunk followed by conv_body, without the long skip connection."""
+        return self.conv_body(self.body(feat))
+
+
+class InplaceResidualDenseBlock(ResidualDenseBlock):
+    """Inference-only ResidualDenseBlock with the same parameters.
+
+    Instead of concatenating the growing features five times, every conv output
+    is written into its channel slice of one dense buffer of
+    num_feat + 4 * num_grow_ch channels; the next conv reads the leading
+    channels of that buffer. The block input lives in buffer[:, :num_feat] and
+    is replaced by the block output in place.
+    """
+
+    def forward_into(self, buffer):
+        num_feat = self.conv1.in_channels
+        num_grow_ch = self.conv1.out_channels
+        end = num_feat
+        for conv in (self.conv1, self.conv2, self.conv3, self.conv4):
+            out = self.lrelu(conv(buffer[:, :end]))
+            buffer[:, end:end + num_grow_ch].copy_(out)
+            end += num_grow_ch
+        x5 = self.conv5(buffer)
+        # Emperically, we use 0.2 to scale the residual for better performance
+        buffer[:, :num_feat].add_(x5.mul_(0.2))
+        return buffer
+
+    def forward(self, x):
+        buffer = _dense_buffer(x, self.conv5.in_channels)
+        return self.forward_into(buffer)[:, :x.shape[1]]
+
+
+class InplaceRRDB(RRDB):
+    """Inference-only RRDB built from InplaceResidualDenseBlock, sharing one dense buffer."""
+
+    def __init__(self, num_feat, num_grow_ch=32):
+        super(InplaceRRDB, self).__init__(num_feat, num_grow_ch, rdb_cls=InplaceResidualDenseBlock)
+
+    def forward_into(self, buffer):
+        num_feat = self.rdb1.conv1.in_channels
+        x = buffer[:, :num_feat].clone()
+        self.rdb1.forward_into(buffer)
+        self.rdb2.forward_into(buffer)
+        self.rdb3.forward_into(buffer)
+        # Emperically, we use 0.2 to scale the residual for better performance
+        buffer[:, :num_feat].mul_(0.2).add_(x)
+        return buffer
+
+    def forward(self, x):
+        buffer = _dense_buffer(x, self.rdb1.conv5.in_channels)
+        return self.forward_into(buffer)[:, :x.shape[1]]
+
+
+class InplaceRRDBNet(RRDBNet):
+    """Inference-optimized RRDBNet; loads the same state dict as RRDBNet.
+
+    The whole trunk runs on a single preallocated dense buffer (see
+    InplaceResidualDenseBlock), so the hundreds of torch.cat copies per forward
+    pass become small per-conv slice writes. Intermediate tensors are modified
+    in place, so it cannot be used for training.
+
+    For a batch larger than one the leading-channel slices buffer[:, :end] are
+    strided and a conv may copy its input first, so the gain over RRDBNet is
+    mostly seen with a batch of one.
+    """
+
+    def __init__(self, num_in_ch, num_out_ch, scale=4, num_feat=64, num_block=23, num_grow_ch=32):
+        super(InplaceRRDBNet, self).__init__(
+            num_in_ch, num_out_ch, scale=scale, num_feat=num_feat, num_block=num_block,
+            num_grow_ch=num_grow_ch, block_cls=InplaceRRDB)
+
+    def trunk(self, feat):
+        buffer = _dense_buffer(feat, self.body[0].rdb1.conv5.in_channels)
+        for block in self.body:
+            block.forward_into(buffer)
+        return self.conv_body(buffer[:, :feat.shape[1]])
+
+
+def _dense_buffer(x, channels):
+    """Allocates a dense-block buffer of `channels` channels holding x in its leading channels."""
+    buffer = x.new_empty((x.shape[0], channels) + tuple(x.shape[2:]))
+    buffer[:, :x.shape[1]].copy_(x)
+    return buffer
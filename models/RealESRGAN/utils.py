@@ -5,17 +5,8 @@ import os
 import io
 
 def pad_reflect(image, pad_size):
-    imsize = image.shape
-    height, width = imsize[:2]
-    new_img = np.zeros([height+pad_size*2, width+pad_size*2, imsize[2]]).astype(np.uint8)
-    new_img[pad_size:-pad_size, pad_size:-pad_size, :] = image
-    
-    new_img[0:pad_size, pad_size:-pad_size, :] = np.flip(image[0:pad_size, :, :], axis=0) #top
-    new_img[-pad_size:, pad_size:-pad_size, :] = np.flip(image[-pad_size:, :, :], axis=0) #bottom
-    new_img[:, 0:pad_size, :] = np.flip(new_img[:, pad_size:pad_size*2, :], axis=1) #left
-    new_img[:, -pad_size:, :] = np.flip(new_img[:, -pad_size*2:-pad_size, :], axis=1) #right
-    
-    return new_img
+    """ Mirrors pad_size pixels (edge included) around the image, keeping its dtype. """
+    return np.pad(image, ((pad_size, pad_size), (pad_size, pad_size), (0, 0)), 'symmetric')
 
 def unpad_image(image, pad_size):
     return image[pad_size:-pad_size, pad_size:-pad_size, :]
@@ -59,48 +50,80 @@ def unpad_patches(image_patches, padding_size):
     return image_patches[:, padding_size:-padding_size, padding_size:-padding_size, :]
 
 
-def split_image_into_overlapping_patches(image_array, patch_size, padding_size=2):
-    """ Splits the image into partially overlapping patches.
-    The patches overlap by padding_size pixels.
-    Pads the image twice:
-        - first to have a size multiple of the patch size,
-        - then to have equal padding at the borders.
+def overlapping_patch_view(image_array, patch_size, padding_size=2):
+    """ Pads the image and returns its overlapping patches as a strided view.
+    The image is edge-padded once, to a multiple of patch_size plus padding_size
+    on every side; patches are windows of that array, so nothing is copied.
     Args:
         image_array: numpy array of the input image.
         patch_size: size of the patches from the original image (without padding).
         padding_size: size of the overlapping area.
+    Returns:
+        (view of shape (rows, cols, patch_size + 2 * padding_size, patch_size + 2 * padding_size, C),
+         shape of the padded image)
     """
     
-    xmax, ymax, _ = image_array.shape
-    x_remainder = xmax % patch_size
-    y_remainder = ymax % patch_size
+    xmax, ymax, channels = image_array.shape
     
     # modulo here is to avoid extending of patch_size instead of 0
-    x_extend = (patch_size - x_remainder) % patch_size
-    y_extend = (patch_size - y_remainder) % patch_size
-    
-    # make sure the image is divisible into regular patches
-    extended_image = np.pad(image_array, ((0, x_extend), (0, y_extend), (0, 0)), 'edge')
-    
-    # add padding around the image to simplify computations
-    padded_image = pad_patch(extended_image, padding_size, channel_last=True)
-    
-    xmax, ymax, _ = padded_image.shape
-    patches = []
-    
-    x_lefts = range(padding_size, xmax - padding_size, patch_size)
-    y_tops = range(padding_size, ymax - padding_size, patch_size)
+    x_extend = (patch_size - xmax % patch_size) % patch_size
+    y_extend = (patch_size - ymax % patch_size) % patch_size
+    
+    padded_image = np.pad(
+        image_array,
+        ((padding_size, x_extend + padding_size), (padding_size, y_extend + padding_size), (0, 0)),
+        'edge',
+    )
+    
+    window = patch_size + 2 * padding_size
+    windows = np.lib.stride_tricks.sliding_window_view(
+        padded_image, (window, window, channels)
+    )
+    patches = windows[::patch_size, ::patch_size, 0]
+    return patches, padded_image.shape
+
+
+def split_image_into_overlapping_patches(image_array, patch_size, padding_size=2):
+    """ Splits the image into partially overlapping patches.
+    The patches overlap by padding_size pixels.
+    Args:
+        image_array: numpy array of the input image.
+        patch_size: size of the patches from the original image (without padding).
+        padding_size: size of the overlapping area.
+    Returns:
+        (contiguous array of shape (n_patches, h, w, C) in row-major patch order,
+         shape of the padded image)
+    """
     
-    for x in x_lefts:
-        for y in y_tops:
-            x_left = x - padding_size
-            y_top = y - padding_size
-            x_right = x + patch_size + padding_size
-            y_bottom = y + patch_size + padding_size
-            patch = padded_image[x_left:x_right, y_top:y_bottom, :]
-            patches.append(patch)
+    patches, padded_shape = overlapping_patch_view(image_array, patch_size, padding_size)
+    rows, cols = patches.shape[:2]
+    return np.ascontiguousarray(patches).reshape((rows * cols,) + patches.shape[2:]), padded_shape
+
+
+def tile_flatness(patches):
+    """ Scores how much detail each tile of an overlapping_patch_view holds.
+    The score is the larger of the luminance standard deviation and the mean
+    absolute horizontal plus vertical luminance difference (edge energy), both
+    in 0-255 units, taken over the whole padded tile so that detail in the
+    overlap also counts.
+    Args:
+        patches: view of shape (rows, cols, h, w, C).
+    Returns:
+        float32 array of shape (rows, cols).
+    """
     
-    return np.array(patches), padded_image.shape
+    rows, cols = patches.shape[:2]
+    scores = np.empty((rows, cols), dtype=np.float32)
+    # one row of tiles at a time keeps the float copy small
+    for row in range(rows):
+        gray = patches[row].mean(axis=-1, dtype=np.float32)
+        std = gray.std(axis=(1, 2))
+        edges = (
+            np.abs(np.diff(gray, axis=1)).mean(axis=(1, 2))
+            + np.abs(np.diff(gray, axis=2)).mean(axis=(1, 2))
+        )
+        scores[row] = np.maximum(std, edges)
+    return scores
 
 
 def stich_together(patches, padded_image_shape, target_shape, padding_size=4):
@@ -111,23 +134,20 @@ def stich_together(patches, padded_image_shape, target_shape, padding_size=4):
         padded_image_shape: shape of the padded image contructed in split_image_into_overlapping_patches
         target_shape: shape of the final image
         padding_size: size of the overlapping area.
+    Returns:
+        view of the canvas cropped to target_shape, with the dtype of patches
     """
     
-    xmax, ymax, _ = padded_image_shape
+    _, ymax, _ = padded_image_shape
     patches = unpad_patches(patches, padding_size)
     patch_size = patches.shape[1]
-    n_patches_per_row = ymax // patch_size
-    
-    complete_image = np.zeros((xmax, ymax, 3))
-    
-    row = -1
-    col = 0
-    for i in range(len(patches)):
-        if i % n_patches_per_row == 0:
-            row += 1
-            col = 0
-        complete_image[
-        row * patch_size: (row + 1) * patch_size, col * patch_size: (col + 1) * patch_size,:
-        ] = patches[i]
-        col += 1
-    return complete_image[0: target_shape[0], 0: target_shape[1], :]
\ No newline at end of file
+    channels = patches.shape[-1]
+    cols = ymax // patch_size
+    rows = len(patches) // cols
+    
+    # every pixel of the canvas is covered by exactly one patch, written in place in one strided copy
+    canvas = np.empty((rows * patch_size, cols * patch_size, channels), dtype=patches.dtype)
+    canvas.reshape(rows, patch_size, cols, patch_size, channels)[...] = patches.reshape(
+        rows, cols, patch_size, patch_size, channels
+    ).transpose(0, 2, 1, 3, 4)
+    return canvas[0: target_shape[0], 0: target_shape[1], :]
@@ -0,0 +1,64 @@
+"""API进程导入耗时预算：import app.main 不得加载推理依赖，且耗时不超过预算"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# 预算可通过环境变量按运行环境调整（秒）
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "2.0"))
+REPEAT = 3
+
+# API进程只负责创建任务和查询，不应加载的模块
+FORBIDDEN_MODULES = (
+    "torch",
+    "torchvision",
+    "cv2",
+    "onnxruntime",
+    "models.BiRefNet.birefnet",
+    "models.RealESRGAN.model",
+)
+
+# 在新的解释器中计时，避免测试进程已导入的模块影响结果
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+"""
+
+project_root = Path(__file__).parent.parent
+
+
+def measure_import() -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=project_root,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+    )
+    assert completed.returncode == 0, f"import app.main failed:\n{completed.stderr}"
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def imports():
+    pytest.importorskip("fastapi")
+    return [measure_import() for _ in range(REPEAT)]
+
+
+def test_api_does_not_import_inference_stack(imports):
+    loaded = {module for result in imports for module in result["modules"]}
+    assert not loaded.intersection(FORBIDDEN_MODULES)
+
+
+def test_import_within_budget(imports):
+    # 取多次中的最小值，排除首次导入时的磁盘缓存等噪声
+    seconds = min(result["seconds"] for result in imports)
+    assert seconds <= IMPORT_BUDGET_SECONDS, (
+        f"import app.main took {seconds:.3f}s, budget {IMPORT_BUDGET_SECONDS:.3f}s"
+    )
@@ -0,0 +1,69 @@
+"""按行带流式编码的PNG解码后应与原图逐像素一致"""
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from app.utils.png_stream import IterStream, encode_png_stream  # noqa: E402
+
+
+def random_image(height: int, width: int) -> "np.ndarray":
+    return np.random.default_rng(height * 1000 + width).integers(
+        0, 256, (height, width, 3), dtype=np.uint8
+    )
+
+
+def decode(data: bytes) -> "np.ndarray":
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.mode == "RGB"
+        return np.asarray(image)
+
+
+@pytest.mark.parametrize(
+    "height, width, band_rows",
+    [
+        (10, 7, 4),  # 最后一个行带只有2行
+        (8, 5, 8),  # 恰好一个行带
+        (6, 3, 1),  # 每行一个行带
+        (1, 9, 256),  # 单行图像
+        (37, 1, 16),  # 单列图像
+    ],
+)
+def test_round_trip(height, width, band_rows):
+    image = random_image(height, width)
+    data = b"".join(encode_png_stream(image, band_rows=band_rows))
+    np.testing.assert_array_equal(decode(data), image)
+
+
+def test_round_trip_uncompressed():
+    image = random_image(12, 11)
+    data = b"".join(encode_png_stream(image, band_rows=5, compress_level=0))
+    np.testing.assert_array_equal(decode(data), image)
+
+
+def test_non_contiguous_input():
+    image = random_image(9, 14)[:, ::2]
+    data = b"".join(encode_png_stream(image, band_rows=4))
+    np.testing.assert_array_equal(decode(data), image)
+
+
+def test_iter_stream_small_reads():
+    image = random_image(20, 13)
+    expected = b"".join(encode_png_stream(image, band_rows=3))
+    stream = IterStream(encode_png_stream(image, band_rows=3))
+    parts = []
+    while True:
+        part = stream.read(7)
+        if not part:
+            break
+        parts.append(part)
+    assert b"".join(parts) == expected
+
+
+def test_rejects_non_rgb_uint8():
+    with pytest.raises(ValueError):
+        next(encode_png_stream(np.zeros((4, 4), dtype=np.uint8)))
+    with pytest.raises(ValueError):
+        next(encode_png_stream(np.zeros((4, 4, 3), dtype=np.float32)))
@@ -0,0 +1,36 @@
+"""InplaceRRDBNet 加载 RRDBNet 的权重后，输出应与原网络一致"""
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from models.RealESRGAN.rrdbnet_arch import InplaceRRDBNet, RRDBNet  # noqa: E402
+
+
+def build_pair(scale: int):
+    torch.manual_seed(0)
+    config = dict(num_in_ch=3, num_out_ch=3, scale=scale, num_feat=16, num_block=2, num_grow_ch=8)
+    reference = RRDBNet(**config).eval()
+    inplace = InplaceRRDBNet(**config).eval()
+    inplace.load_state_dict(reference.state_dict(), strict=True)
+    return reference, inplace
+
+
+@pytest.mark.parametrize("scale", [2, 4, 8])
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_inplace_matches_reference(scale, batch_size):
+    reference, inplace = build_pair(scale)
+    x = torch.rand((batch_size, 3, 16, 20))
+    with torch.no_grad():
+        expected = reference(x)
+        actual = inplace(x)
+    assert actual.shape == expected.shape
+    assert torch.allclose(expected, actual, rtol=1e-4, atol=1e-5)
+
+
+def test_inplace_does_not_modify_input():
+    _, inplace = build_pair(4)
+    x = torch.rand((2, 3, 12, 12))
+    original = x.clone()
+    with torch.no_grad():
+        inplace(x)
+    assert torch.equal(x, original)